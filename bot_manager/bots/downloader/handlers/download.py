@@ -10,10 +10,14 @@
 import re
 import os
 import time
+import random
 import logging
 import asyncio
 import aiohttp
+from functools import lru_cache
+from urllib.parse import urlsplit
 from aiogram import Router, types, F
+from aiogram.exceptions import TelegramBadRequest, TelegramRetryAfter
 from aiogram.types import FSInputFile, BufferedInputFile, InputMediaPhoto, InputMediaVideo
 
 from ..services.downloader import VideoDownloader
@@ -23,6 +27,8 @@ from ..services.instaloader_downloader import InstaloaderDownloader
 from ..services.savenow_downloader import SaveNowDownloader
 from ..services.routing import get_routing_chain, get_source_key
 from ..services.provider_health import check_provider
+from ..services.http_session import http_session
+from ..services.telegram_limiter import tg_limiter
 from ..services.cache import (
     get_cached_file_ids,
     cache_file_ids,
@@ -47,8 +53,7 @@ from ..messages import (
 )
 from bot_manager.middlewares import log_action
 from bot_manager.services.error_logger import error_logger
-from shared.utils.video_fixer import get_video_dimensions, get_video_duration, download_thumbnail, ensure_faststart, generate_thumbnail_from_video
-from shared.database import AsyncSessionLocal
+from shared.utils.video_fixer import probe_video, download_thumbnail, ensure_faststart, generate_thumbnail_from_video
 from ..services.flyer_checker import check_and_allow
 
 router = Router()
@@ -78,6 +83,12 @@ instaloader_dl = InstaloaderDownloader()  # Instagram (primary)
 # === RETRY CONFIGURATION ===
 RETRY_MAX_ATTEMPTS = 3
 RETRY_BACKOFF = [5, 10, 20]  # секунды между попытками
+# Доля задержки, которая рандомизируется: 0.5 -> ждём от base/2 до base.
+# Без джиттера все загрузки, упавшие в одно окно rate limit, повторяют разом
+RETRY_JITTER = 0.5
+# Сколько раз подряд ждём retry_after от Telegram (flood control) — эти ожидания
+# не считаются попытками, но бесконечно ждать тоже не будем
+RETRY_AFTER_MAX_WAITS = 3
 
 # Ошибки которые стоит ретраить (network/transport)
 RETRYABLE_ERRORS = (
@@ -119,6 +130,33 @@ STALL_PATTERNS = (
 )
 
 
+def _any_substring_re(patterns) -> "re.Pattern":
+    """Один regex «есть ли в строке любая из подстрок» (без учёта регистра).
+
+    Один проход C-движка по строке вместо .lower() копии и N проверок `in`
+    """
+    return re.compile("|".join(map(re.escape, patterns)), re.IGNORECASE)
+
+
+RETRYABLE_ERROR_RE = _any_substring_re(RETRYABLE_ERROR_STRINGS)
+HARD_KILL_RE = _any_substring_re(HARD_KILL_PATTERNS)
+STALL_RE = _any_substring_re(STALL_PATTERNS)
+
+# Transport-ошибки, после которых повторяем отправку альбома
+CAROUSEL_RETRYABLE_RE = _any_substring_re(("closing transport", "connection reset", "timeout"))
+
+# yt-dlp (TikTok/Pinterest): контент реально недоступен — НЕ ретраим
+YTDLP_PERMANENT_ERROR_RE = _any_substring_re((
+    "private", "login", "sign in", "age", "region",
+    "not available", "copyright", "removed", "deleted",
+    "unavailable", "blocked", "restricted", "nsfw",
+))
+# yt-dlp: transient ошибки, на которых платформы "флапают" — один повтор
+YTDLP_TRANSIENT_ERROR_RE = _any_substring_re((
+    "unable to extract", "no video formats", "connection reset", "timed out",
+))
+
+
 def classify_error(error: str) -> str:
     """
     Phase 7.0 Telemetry: Классифицирует ошибку для аналитики и cooldown.
@@ -131,19 +169,20 @@ def classify_error(error: str) -> str:
     if not error:
         return "PROVIDER_BUG"
 
-    error_lower = error.lower()
+    if HARD_KILL_RE.search(error):
+        return "HARD_KILL"
 
-    for pattern in HARD_KILL_PATTERNS:
-        if pattern in error_lower:
-            return "HARD_KILL"
-
-    for pattern in STALL_PATTERNS:
-        if pattern in error_lower:
-            return "STALL"
+    if STALL_RE.search(error):
+        return "STALL"
 
     return "PROVIDER_BUG"
 
 
+def platform_family(platform: str) -> str:
+    """Платформа без подтипа: 'youtube_full' -> 'youtube', 'instagram_reel' -> 'instagram'"""
+    return platform.partition("_")[0]
+
+
 def get_content_bucket(platform: str, content_type: str = None, duration_sec: int = 0) -> str:
     """
     Phase 7.1 Telemetry: Определяет bucket по типу контента.
@@ -159,13 +198,14 @@ def get_content_bucket(platform: str, content_type: str = None, duration_sec: in
         - tiktok: 'video'
         - pinterest: 'photo' / 'video'
     """
-    if platform == "youtube" or platform.startswith("youtube_"):
+    family = platform_family(platform)
+    if family == "youtube":
         return "shorts" if duration_sec < 300 else "full"
-    elif platform == "instagram" or platform.startswith("instagram_"):
+    elif family == "instagram":
         return content_type or "post"
-    elif platform == "tiktok":
+    elif family == "tiktok":
         return "video"
-    elif platform == "pinterest":
+    elif family == "pinterest":
         return content_type or "video"
     return "unknown"
 
@@ -181,49 +221,50 @@ def format_duration(seconds: int) -> str:
     return f"{minutes}:{secs:02d}"
 
 
+# (минимальная высота, метка) по убыванию высоты
+QUALITY_LABELS = (
+    (2160, "4K"),
+    (1440, "1440p"),
+    (1080, "1080p"),
+    (720, "720p"),
+    (480, "480p"),
+    (360, "360p"),
+    (240, "240p"),
+)
+
+
 def get_quality_label(height: int) -> str:
     """Возвращает метку качества по высоте видео."""
-    if height >= 2160:
-        return "4K"
-    elif height >= 1440:
-        return "1440p"
-    elif height >= 1080:
-        return "1080p"
-    elif height >= 720:
-        return "720p"
-    elif height >= 480:
-        return "480p"
-    elif height >= 360:
-        return "360p"
-    elif height >= 240:
-        return "240p"
+    for min_height, label in QUALITY_LABELS:
+        if height >= min_height:
+            return label
     return f"{height}p" if height > 0 else ""
 
 
+# Telegram caption max 1024 chars, название обрезаем с запасом
+YOUTUBE_TITLE_MAX_LEN = 200
+YOUTUBE_CAPTION_SIGNATURE = "📥 Скачано через @SaveNinja_bot"
+
+
 def make_youtube_full_caption(title: str, height: int, duration: int) -> str:
     """Создаёт расширенный caption для YouTube Full видео."""
-    lines = []
+    # Качество и длительность (format_duration всегда непустая: минимум "0:00")
+    quality = get_quality_label(height)
+    duration_str = format_duration(duration)
+    stats = f"📊 {quality} | {duration_str}" if quality else f"📊 {duration_str}"
 
     # Название (обрезаем если слишком длинное)
     if title and title != "video":
-        # Telegram caption max 1024 chars, оставляем запас
-        title_truncated = title[:200] + "..." if len(title) > 200 else title
-        lines.append(f"🎬 {title_truncated}")
+        if len(title) > YOUTUBE_TITLE_MAX_LEN:
+            title = title[:YOUTUBE_TITLE_MAX_LEN] + "..."
+        return f"🎬 {title}\n{stats}\n{YOUTUBE_CAPTION_SIGNATURE}"
 
-    # Качество и длительность
-    quality = get_quality_label(height)
-    duration_str = format_duration(duration)
-    if quality and duration_str:
-        lines.append(f"📊 {quality} | {duration_str}")
-    elif quality:
-        lines.append(f"📊 {quality}")
-    elif duration_str:
-        lines.append(f"📊 {duration_str}")
+    return f"{stats}\n{YOUTUBE_CAPTION_SIGNATURE}"
 
-    # Подпись
-    lines.append("📥 Скачано через @SaveNinja_bot")
 
-    return "\n".join(lines)
+# Тип Instagram контента по сегменту пути: один проход regex без .lower() копии URL,
+# имя сработавшей группы (match.lastgroup) и есть bucket
+INSTAGRAM_BUCKET_RE = re.compile(r"/(?:(?P<reel>reels?)|(?P<story>stories))/", re.IGNORECASE)
 
 
 def detect_instagram_bucket(url: str, is_carousel: bool = False) -> str:
@@ -233,16 +274,55 @@ def detect_instagram_bucket(url: str, is_carousel: bool = False) -> str:
     Returns:
         'reel' / 'story' / 'carousel' / 'post'
     """
-    url_lower = url.lower()
-    if "/reel/" in url_lower or "/reels/" in url_lower:
-        return "reel"
-    elif "/stories/" in url_lower:
-        return "story"
+    match = INSTAGRAM_BUCKET_RE.search(url)
+    if match:
+        return match.lastgroup
     elif is_carousel:
         return "carousel"
     return "post"
 
 
+# Одновременных ffprobe на процесс (карусель из 10 видео не должна разом
+# порождать 10 процессов, да ещё и у нескольких юзеров параллельно)
+PROBE_CONCURRENCY = 5
+_probe_semaphore = asyncio.Semaphore(PROBE_CONCURRENCY)
+
+
+async def probe_video_async(video_path: str) -> tuple[int, int, int]:
+    """probe_video в потоке, не более PROBE_CONCURRENCY одновременно"""
+    async with _probe_semaphore:
+        return await asyncio.to_thread(probe_video, video_path)
+
+
+def build_carousel_media_group(files, probes: dict) -> list:
+    """
+    Собирает альбом для answer_media_group.
+
+    Args:
+        files: файлы карусели (CarouselFile)
+        probes: file_path -> (width, height, duration) для видео (см. probe_video)
+    """
+    media_group = []
+    for i, file in enumerate(files):
+        input_file = FSInputFile(file.file_path, filename=file.filename)
+        caption = CAPTION if i == 0 else None  # Подпись только к первому
+
+        if file.is_photo:
+            media_group.append(InputMediaPhoto(media=input_file, caption=caption))
+        else:
+            # Размеры и длительность для правильного отображения
+            width, height, duration = probes.get(file.file_path, (0, 0, 0))
+            media_group.append(InputMediaVideo(
+                media=input_file,
+                caption=caption,
+                duration=duration if duration > 0 else None,
+                width=width if width > 0 else None,
+                height=height if height > 0 else None,
+                supports_streaming=True
+            ))
+    return media_group
+
+
 def _is_retryable_error(error: Exception) -> bool:
     """Проверяет, стоит ли ретраить эту ошибку"""
     # Проверяем тип исключения
@@ -250,8 +330,13 @@ def _is_retryable_error(error: Exception) -> bool:
         return True
 
     # Проверяем текст ошибки
-    error_str = str(error).lower()
-    return any(s in error_str for s in RETRYABLE_ERROR_STRINGS)
+    return RETRYABLE_ERROR_RE.search(str(error)) is not None
+
+
+def _retry_delay(base: float) -> float:
+    """Задержка перед повтором с джиттером: base * (1 - RETRY_JITTER) + random(0, base * RETRY_JITTER)"""
+    spread = base * RETRY_JITTER
+    return base - spread + random.uniform(0, spread)
 
 
 async def send_with_retry(
@@ -286,25 +371,45 @@ async def send_with_retry(
         backoff = RETRY_BACKOFF
 
     last_error = None
+    flood_waits = 0
+    attempt = 0
 
-    for attempt in range(max_attempts):
+    # thumbnail=True — решаем один раз до цикла: есть файл — будем пересоздавать
+    # FSInputFile на каждую попытку, нет — просто убираем ключ
+    use_thumb = False
+    if send_kwargs.get('thumbnail') is True:
+        send_kwargs.pop('thumbnail')
+        use_thumb = bool(thumb_path and os.path.exists(thumb_path))
+
+    while attempt < max_attempts:
         try:
             # Пересоздаём FSInputFile на каждую попытку (handle может быть "одноразовый")
             media_file = FSInputFile(file_path, filename=filename)
+            if use_thumb:
+                send_kwargs['thumbnail'] = FSInputFile(thumb_path)
 
-            # Копируем kwargs для модификации
-            kwargs = dict(send_kwargs)
+            # Отправляем (общий лимит отправок бота)
+            async with tg_limiter.limit():
+                result = await send_func(media_file, **send_kwargs)
+            return result
 
-            # Пересоздаём thumbnail если есть путь и флаг thumbnail=True
-            if thumb_path and os.path.exists(thumb_path) and kwargs.get('thumbnail') is True:
-                kwargs['thumbnail'] = FSInputFile(thumb_path)
-            elif kwargs.get('thumbnail') is True:
-                # thumbnail=True но нет файла — убираем из kwargs
-                kwargs.pop('thumbnail', None)
+        except TelegramRetryAfter as e:
+            # Flood control: Telegram сам говорит, сколько ждать — ждём ровно столько
+            # (+ немного джиттера) и не тратим на это попытку
+            last_error = e
+            if flood_waits >= RETRY_AFTER_MAX_WAITS:
+                logger.error(f"[RETRY] Flood control persists after {flood_waits} waits: {e}")
+                raise
+            flood_waits += 1
+            tg_limiter.pause(e.retry_after)
+            wait_time = e.retry_after + random.uniform(0, 1)
+            logger.warning(f"[RETRY] Flood control, waiting {wait_time:.1f}s (retry_after={e.retry_after})")
+            await asyncio.sleep(wait_time)
 
-            # Отправляем
-            result = await send_func(media_file, **kwargs)
-            return result
+        except TelegramBadRequest as e:
+            # Ответ Telegram на сам запрос (file too big, wrong file id, ...) — повтор не поможет
+            logger.warning(f"[RETRY] Bad request, not retrying (attempt {attempt + 1}): {e}")
+            raise
 
         except Exception as e:
             last_error = e
@@ -315,12 +420,13 @@ async def send_with_retry(
                 raise
 
             if attempt < max_attempts - 1:
-                wait_time = backoff[attempt] if attempt < len(backoff) else backoff[-1]
+                wait_time = _retry_delay(backoff[attempt] if attempt < len(backoff) else backoff[-1])
                 logger.warning(
                     f"[RETRY] Retryable error (attempt {attempt + 1}/{max_attempts}): {e}. "
-                    f"Waiting {wait_time}s..."
+                    f"Waiting {wait_time:.1f}s..."
                 )
                 await asyncio.sleep(wait_time)
+                attempt += 1
             else:
                 logger.error(f"[RETRY] All {max_attempts} attempts failed: {e}")
                 raise
@@ -330,25 +436,102 @@ async def send_with_retry(
 
 
 # Паттерн для поддерживаемых URL
-URL_PATTERN = re.compile(
-    r"https?://(?:www\.|m\.|vm\.|vt\.|[a-z]{2}\.)?"
+# google-re2 (если установлен): DFA с линейным временем на любой входной строке,
+# один проход по тексту сообщения. Паттерн совместим с обоими движками,
+# флаг регистра задан inline — у re2.compile другая сигнатура флагов
+try:
+    import re2 as _url_re
+except ImportError:
+    _url_re = re
+
+URL_PATTERN = _url_re.compile(
+    r"(?i)https?://(?:www\.|m\.|vm\.|vt\.|[a-z]{2}\.)?"
     r"(?:"
     r"tiktok\.com|"                          # TikTok
     r"instagram\.com|instagr\.am|"           # Instagram (все форматы)
     r"youtube\.com|youtu\.be|"               # YouTube (полные + Shorts)
     r"pinterest\.[a-z.]+|pin\.it"            # Pinterest + короткие ссылки
     r")"
-    r"[^\s]*",
-    re.IGNORECASE
+    r"[^\s]*"
 )
 
 
-def extract_url_from_text(text: str) -> str | None:
-    """Извлечь URL из текста (для сообщений типа 'Take a look at https://...')"""
-    if not text:
-        return None
-    match = URL_PATTERN.search(text)
-    return match.group() if match else None
+# Сколько ссылок из одного сообщения обрабатываем (пересланные подборки ссылок)
+MAX_URLS_PER_MESSAGE = 3
+
+
+def extract_urls_from_text(text: str) -> tuple[str, ...]:
+    """Извлечь поддерживаемые URL из текста (для сообщений типа 'Take a look at https://...').
+
+    Без дублей, в порядке появления, не больше MAX_URLS_PER_MESSAGE.
+    """
+    # Дешёвый C-level префильтр: без '://' ссылки быть не может — regex не запускаем
+    if not text or '://' not in text:
+        return ()
+    urls = dict.fromkeys(match.group() for match in URL_PATTERN.finditer(text))
+    return tuple(urls)[:MAX_URLS_PER_MESSAGE]
+
+
+# Хосты коротких ссылок, которые нужно резолвить (сравнение с хостом целиком,
+# а не подстрокой по всему URL — 'pin.it' не должен матчить 'spin.it' или query)
+SHORT_URL_HOSTS = frozenset({
+    'pin.it',           # Pinterest
+    'vt.tiktok.com',    # TikTok short
+    'vm.tiktok.com',    # TikTok mobile short
+    'instagr.am',       # Instagram short
+})
+TIKTOK_HOST_SUFFIXES = ('.tiktok.com',)
+
+
+def needs_short_url_resolution(url: str) -> bool:
+    """Проверить по хосту, является ли URL короткой ссылкой"""
+    parts = urlsplit(url)
+    host = (parts.hostname or '').removeprefix('www.')
+    if host in SHORT_URL_HOSTS:
+        return True
+    # TikTok another short format: tiktok.com/t/...
+    is_tiktok = host == 'tiktok.com' or host.endswith(TIKTOK_HOST_SUFFIXES)
+    return is_tiktok and parts.path.startswith('/t/')
+
+
+# Хост (без поддомена) -> платформа. URL_PATTERN пропускает максимум один
+# поддомен (www., m., vm., vt., ru. ...), так что хватает двух поисков в dict
+HOST_TO_PLATFORM = {
+    'instagram.com': 'instagram',
+    'instagr.am': 'instagram',
+    'tiktok.com': 'tiktok',
+    'youtube.com': 'youtube',
+    'youtu.be': 'youtube',
+    'pin.it': 'pinterest',
+}
+
+
+@lru_cache(maxsize=256)
+def _platform_by_host(host: str) -> str:
+    """Платформа по хосту: сам хост, затем хост без первого поддомена"""
+    for candidate in (host, host.partition('.')[2]):
+        platform = HOST_TO_PLATFORM.get(candidate)
+        if platform:
+            return platform
+        # pinterest.com, pinterest.co.uk, pinterest.de ...
+        if candidate.startswith('pinterest.'):
+            return 'pinterest'
+    return 'unknown'
+
+
+def detect_url_platform(url: str) -> str:
+    """
+    Определить платформу по хосту URL.
+
+    Returns:
+        'instagram' / 'tiktok' / 'youtube_shorts' / 'youtube_full' / 'pinterest' / 'unknown'
+    """
+    parts = urlsplit(url)
+    platform = _platform_by_host(parts.hostname or '')
+    if platform == 'youtube':
+        # Определяем shorts vs full по URL
+        return 'youtube_shorts' if '/shorts/' in parts.path.lower() else 'youtube_full'
+    return platform
 
 
 async def resolve_short_url(url: str) -> str:
@@ -360,22 +543,9 @@ async def resolve_short_url(url: str) -> str:
     - TikTok: vt.tiktok.com, vm.tiktok.com -> tiktok.com/@user/video/ID
     - Instagram: instagr.am -> instagram.com
     """
-    url_lower = url.lower()
-
-    # Паттерны коротких URL которые нужно резолвить
-    short_url_patterns = [
-        'pin.it',           # Pinterest
-        'vt.tiktok.com',    # TikTok short
-        'vm.tiktok.com',    # TikTok mobile short
-        'tiktok.com/t/',    # TikTok another short format
-        'instagr.am',       # Instagram short
-    ]
-
-    needs_resolution = any(pattern in url_lower for pattern in short_url_patterns)
-
-    if needs_resolution:
+    if needs_short_url_resolution(url):
         try:
-            async with aiohttp.ClientSession() as session:
+            async with http_session() as session:
                 async with session.head(url, allow_redirects=True, timeout=aiohttp.ClientTimeout(total=10)) as resp:
                     resolved_url = str(resp.url)
                     if resolved_url != url:
@@ -399,11 +569,14 @@ async def update_progress_message(status_msg, done_event: asyncio.Event, progres
     try:
         last_update_time = start_time
 
-        while not done_event.is_set():
-            await asyncio.sleep(UPDATE_INTERVAL)
-
-            if done_event.is_set():
-                break
+        while True:
+            # Ждём либо конца скачивания, либо очередного интервала —
+            # при done_event таск выходит сразу, а не досыпает до минуты
+            try:
+                await asyncio.wait_for(done_event.wait(), timeout=UPDATE_INTERVAL)
+                return
+            except asyncio.TimeoutError:
+                pass
 
             # Считаем прошедшее время
             elapsed = int(time.time() - start_time)
@@ -432,25 +605,53 @@ async def update_progress_message(status_msg, done_event: asyncio.Event, progres
         logger.warning(f"[PROGRESS] Update error: {e}")
 
 
+# Платформы, для которых RapidAPI годится как FALLBACK
+RAPIDAPI_FALLBACK_PLATFORMS = frozenset({'youtube_shorts', 'youtube_full', 'tiktok', 'pinterest'})
+
+
 def use_rapidapi_primary(url: str) -> bool:
     """Проверяет, нужно ли использовать RapidAPI как ОСНОВНОЙ способ"""
-    url_lower = url.lower()
     # RapidAPI только для Instagram (yt-dlp требует авторизации)
     # YouTube обрабатывается отдельно по длительности
-    return any(domain in url_lower for domain in [
-        'instagram.com', 'instagr.am'
-    ])
+    return detect_url_platform(url) == 'instagram'
 
 def supports_rapidapi_fallback(url: str) -> bool:
     """Проверяет, поддерживает ли RapidAPI этот URL как FALLBACK"""
-    url_lower = url.lower()
     # RapidAPI поддерживает YouTube (Shorts fallback), TikTok, Pinterest
     # Instagram уже использует RapidAPI primary
-    return any(domain in url_lower for domain in [
-        'youtube.com', 'youtu.be',
-        'tiktok.com',
-        'pinterest.', 'pin.it'
-    ])
+    return detect_url_platform(url) in RAPIDAPI_FALLBACK_PLATFORMS
+
+
+# Технические ошибки -> ключ из messages.py. Порядок важен: побеждает первая
+# подошедшая категория (а не самое левое совпадение в строке), поэтому
+# это список regex'ов по категориям, а не одна общая альтернация
+USER_ERROR_RULES = (
+    # Приватный контент / требует логин
+    (_any_substring_re(("private", "login", "sign in")), "private"),
+    # Возрастное ограничение — для юзера это тоже "недоступно"
+    (_any_substring_re(("age", "confirm your age")), "private"),
+    # Размер файла
+    (_any_substring_re(("too large", "слишком больш", ">2gb")), "too_large"),
+    # Контент не найден / удалён
+    (_any_substring_re(("no media", "no suitable", "not found", "does not exist", "deleted", "removed")), "not_found"),
+    # Таймаут
+    (_any_substring_re(("timeout", "timed out")), "timeout"),
+    # Недоступен (generic)
+    (_any_substring_re(("unavailable", "not available")), "unavailable"),
+    # Региональные ограничения
+    (_any_substring_re(("region", "country", "geo", "blocked")), "region"),
+    # Ошибки ffmpeg/обработки
+    (_any_substring_re(("ffmpeg", "codec", "encode", "processing", "corrupt")), "processing"),
+    # Сетевые ошибки
+    (_any_substring_re(("connection", "network", "ssl", "socket", "reset", "refused")), "connection"),
+    # HTTP ошибки от провайдеров (500, 403, 429 etc) - скрываем детали
+    (_any_substring_re(("http error", "http 5", "http 4", "rate limit", "quota")), "api"),
+    # API ошибки (generic)
+    (_any_substring_re(("api", "unable to extract")), "api"),
+)
+
+# Уже человеческие ошибки (начинаются с эмодзи)
+HUMAN_ERROR_PREFIXES = ("❌", "⏱", "📦", "🔒", "🌍", "⚠️", "📡", "⚙️", "📤", "🔗", "📖")
 
 
 def make_user_friendly_error(error: str) -> str:
@@ -462,99 +663,72 @@ def make_user_friendly_error(error: str) -> str:
     if not error:
         return get_error_message("unknown")
 
-    error_lower = error.lower()
-
-    # Уже человеческие ошибки (начинаются с эмодзи) - возвращаем как есть
-    if error.startswith(("❌", "⏱", "📦", "🔒", "🌍", "⚠️", "📡", "⚙️", "📤", "🔗", "📖")):
+    # Уже человеческие ошибки - возвращаем как есть
+    if error.startswith(HUMAN_ERROR_PREFIXES):
         return error
 
     # Технические ошибки -> человеческие (используем messages.py)
-    # Приватный контент / требует логин
-    if "private" in error_lower or "login" in error_lower or "sign in" in error_lower:
-        return get_error_message("private")
-    # Возрастное ограничение
-    elif "age" in error_lower or "confirm your age" in error_lower:
-        return get_error_message("private")  # Для юзера это тоже "недоступно"
-    # Размер файла
-    elif "too large" in error_lower or "слишком больш" in error_lower or ">2gb" in error_lower:
-        return get_error_message("too_large")
-    # Контент не найден / удалён
-    elif any(s in error_lower for s in ["no media", "no suitable", "not found", "does not exist", "deleted", "removed"]):
-        return get_error_message("not_found")
-    # Таймаут
-    elif "timeout" in error_lower or "timed out" in error_lower:
-        return get_error_message("timeout")
-    # Недоступен (generic)
-    elif "unavailable" in error_lower or "not available" in error_lower:
-        return get_error_message("unavailable")
-    # Региональные ограничения
-    elif any(s in error_lower for s in ["region", "country", "geo", "blocked"]):
-        return get_error_message("region")
-    # Ошибки ffmpeg/обработки
-    elif any(s in error_lower for s in ["ffmpeg", "codec", "encode", "processing", "corrupt"]):
-        return get_error_message("processing")
-    # Сетевые ошибки
-    elif any(s in error_lower for s in ["connection", "network", "ssl", "socket", "reset", "refused"]):
-        return get_error_message("connection")
-    # HTTP ошибки от провайдеров (500, 403, 429 etc) - скрываем детали
-    elif any(s in error_lower for s in ["http error", "http 5", "http 4", "rate limit", "quota"]):
-        return get_error_message("api")
-    # API ошибки (generic)
-    elif "api" in error_lower or "unable to extract" in error_lower:
-        return get_error_message("api")
+    for pattern, message_key in USER_ERROR_RULES:
+        if pattern.search(error):
+            return get_error_message(message_key)
+
     # Всё остальное - generic ошибка
-    else:
-        return get_error_message("unknown")
+    return get_error_message("unknown")
 
 
 @router.message(F.text)
 async def handle_url(message: types.Message):
     """Обработка ссылок - скачивание видео/фото + аудио"""
     # Извлекаем URL из текста (работает с "Take a look at URL" и пересланными сообщениями)
-    url = extract_url_from_text(message.text)
-    if not url:
+    urls = extract_urls_from_text(message.text)
+    if not urls:
         return
 
-    user_id = message.from_user.id
+    # Резолвим короткие ссылки (pin.it, vt.tiktok.com, vm.tiktok.com) — все сразу,
+    # HEAD-запросы идут параллельно через общую HTTP сессию
+    resolved_urls = await asyncio.gather(*(resolve_short_url(url) for url in urls))
+
+    # Сами скачивания — по очереди (лимит одновременных скачиваний на юзера).
+    # Остановили Flyer или rate limit — остальные ссылки не трогаем, иначе юзер
+    # получит тот же отказ/задания на каждую ссылку
+    for url in resolved_urls:
+        if await process_url(message, url) is False:
+            break
+
+
+async def process_url(message: types.Message, url: str) -> bool | None:
+    """Скачать и отправить одну ссылку (URL уже разрезолвлен)
 
-    # Резолвим короткие ссылки (pin.it, vt.tiktok.com, vm.tiktok.com)
-    url = await resolve_short_url(url)
+    Returns:
+        False — юзера остановили (задания Flyer или rate limit), остальные
+        ссылки из сообщения обрабатывать не нужно; иначе None
+    """
+    user_id = message.from_user.id
 
     logger.info(f"Download request: user={user_id}, url={url}")
 
+    # URL после резолва больше не меняется — приводим к нижнему регистру один раз
+    url_lower = url.lower()
+
     # Определяем платформу для логирования
-    platform = "unknown"
-    if "instagram" in url.lower() or "instagr.am" in url.lower():
-        platform = "instagram"
-    elif "tiktok" in url.lower():
-        platform = "tiktok"
-    elif "youtube" in url.lower() or "youtu.be" in url.lower():
-        # Определяем shorts vs full по URL
-        if "/shorts/" in url.lower():
-            platform = "youtube_shorts"
-        else:
-            platform = "youtube_full"
-    elif "pinterest" in url.lower() or "pin.it" in url.lower():
-        platform = "pinterest"
+    platform = detect_url_platform(url)
 
     # Логируем запрос на скачивание
     await log_action(user_id, "download_request", {"platform": platform, "url": url[:200]})
 
     # === ПРОВЕРКА ПОДПИСКИ (FlyerService) ===
     # Проверяем нужно ли показать задания на подписку
-    flyer_result = None  # Для передачи в log_action
-    async with AsyncSessionLocal() as session:
-        language_code = message.from_user.language_code or "ru"
-        flyer_result = await check_and_allow(session, user_id, platform, language_code)
-        if not flyer_result.allowed:
-            # Юзер не подписан — FlyerAPI уже показал ему сообщение с заданиями
-            logger.info(f"[FLYER] User {user_id} blocked for {platform}, showing subscription tasks")
-            # Логируем показ рекламы для статистики
-            await log_action(user_id, "flyer_ad_shown", {
-                "platform": platform,
-                "url": url[:200],
-            })
-            return
+    language_code = message.from_user.language_code or "ru"
+    flyer_result = await check_and_allow(user_id, platform, language_code)
+    if not flyer_result.allowed:
+        # Юзер не подписан — FlyerAPI уже показал ему сообщение с заданиями
+        logger.info(f"[FLYER] User {user_id} blocked for {platform}, showing subscription tasks")
+        # Логируем показ рекламы для статистики
+        await log_action(user_id, "flyer_ad_shown", {
+            "platform": platform,
+            "url": url[:200],
+        })
+        return False
 
     # === ПРОВЕРЯЕМ КЭШ (мгновенная отправка) ===
     cached_video, cached_audio = await get_cached_file_ids(url)
@@ -564,11 +738,14 @@ async def handle_url(message: types.Message):
         try:
             # Пробуем как видео, если не получится - как фото
             try:
-                await message.answer_video(video=cached_video, caption=CAPTION)
+                async with tg_limiter.limit():
+                    await message.answer_video(video=cached_video, caption=CAPTION)
             except Exception:
-                await message.answer_photo(photo=cached_video, caption=CAPTION)
+                async with tg_limiter.limit():
+                    await message.answer_photo(photo=cached_video, caption=CAPTION)
             if cached_audio:
-                await message.answer_audio(audio=cached_audio, caption=CAPTION)
+                async with tg_limiter.limit():
+                    await message.answer_audio(audio=cached_audio, caption=CAPTION)
             return
         except Exception as e:
             logger.warning(f"Cache send failed, re-downloading: {e}")
@@ -577,7 +754,7 @@ async def handle_url(message: types.Message):
     # === ПРОВЕРЯЕМ RATE LIMIT ===
     if not await acquire_user_slot(user_id):
         await message.answer(get_rate_limit_message())
-        return
+        return False
 
     # Ops Dashboard: увеличиваем счётчик активных скачиваний
     await increment_active_downloads()
@@ -602,10 +779,10 @@ async def handle_url(message: types.Message):
             # Phase 7.0 Telemetry: stage breakdown
             'first_byte_time': None,  # Время когда начали получать данные
             'download_end_time': None,  # Время завершения скачивания
+            'last_log_time': 0,  # Последний лог прогресса (для троттлинга)
         }
 
         # Callback для прогресса yt-dlp
-        last_log_time = [0]  # Используем список чтобы изменять в замыкании
         def progress_callback(d):
             if d['status'] == 'downloading':
                 progress_data['downloaded_bytes'] = d.get('downloaded_bytes', 0)
@@ -618,12 +795,12 @@ async def handle_url(message: types.Message):
 
                 # Логируем прогресс раз в 60 секунд (для отладки)
                 now = time.time()
-                if now - last_log_time[0] >= 60:
+                if now - progress_data['last_log_time'] >= 60:
                     downloaded_mb = progress_data['downloaded_bytes'] / (1024 * 1024)
                     total_mb = progress_data['total_bytes'] / (1024 * 1024) if progress_data['total_bytes'] else 0
                     speed_kbps = (progress_data['speed'] or 0) / 1024
                     logger.info(f"[PROGRESS] {downloaded_mb:.1f}MB / {total_mb:.1f}MB, speed={speed_kbps:.1f}KB/s")
-                    last_log_time[0] = now
+                    progress_data['last_log_time'] = now
 
             elif d['status'] == 'finished':
                 # Phase 7.0 Telemetry: фиксируем момент завершения скачивания
@@ -644,8 +821,10 @@ async def handle_url(message: types.Message):
         # YouTube полные (≥5 мин) -> только pytubefix
         # TikTok/Pinterest -> yt-dlp
 
-        is_instagram = any(d in url.lower() for d in ['instagram.com', 'instagr.am'])
-        is_youtube = any(d in url.lower() for d in ['youtube.com', 'youtu.be'])
+        # Платформа уже определена по хосту выше — не сканируем URL повторно
+        family = platform_family(platform)
+        is_instagram = family == "instagram"
+        is_youtube = family == "youtube"
 
         # INSTAGRAM - RapidAPI (instaloader блокируется Instagram без логина)
         if is_instagram:
@@ -668,7 +847,7 @@ async def handle_url(message: types.Message):
                     error_details={"source": "rapidapi", "error_class": error_class}
                 )
                 # Специальная ошибка для Stories (истекли, приватные, удалены)
-                if "/stories/" in url.lower():
+                if "/stories/" in url_lower:
                     await status_msg.edit_text(get_error_message("story"))
                 else:
                     await status_msg.edit_text(f"❌ {make_user_friendly_error(carousel.error)}")
@@ -678,63 +857,51 @@ async def handle_url(message: types.Message):
             if len(carousel.files) > 1:
                 await status_msg.edit_text(get_uploading_message())
 
-                # Формируем MediaGroup
-                media_group = []
-                for i, file in enumerate(carousel.files):
-                    input_file = FSInputFile(file.file_path, filename=file.filename)
-                    caption = CAPTION if i == 0 else None  # Подпись только к первому
+                # Размеры и длительность всех видео: один ffprobe на файл, файлы
+                # параллельно (до PROBE_CONCURRENCY) и в потоках — event loop не блокируется
+                video_paths = [f.file_path for f in carousel.files if not f.is_photo]
+                probes = dict(zip(video_paths, await asyncio.gather(
+                    *(probe_video_async(path) for path in video_paths)
+                )))
 
-                    if file.is_photo:
-                        media_group.append(InputMediaPhoto(media=input_file, caption=caption))
-                    else:
-                        # Извлекаем размеры и длительность для правильного отображения
-                        width, height = get_video_dimensions(file.file_path)
-                        duration = get_video_duration(file.file_path)
-                        media_group.append(InputMediaVideo(
-                            media=input_file,
-                            caption=caption,
-                            duration=duration if duration > 0 else None,
-                            width=width if width > 0 else None,
-                            height=height if height > 0 else None,
-                            supports_streaming=True
-                        ))
+                # Формируем MediaGroup
+                media_group = build_carousel_media_group(carousel.files, probes)
 
                 # Отправляем альбом с ClientTimeout для sock_read
                 # Retry logic для каруселей (fallback на случай реальных network issues)
                 max_retries = 3
-                for attempt in range(max_retries):
+                flood_waits = 0
+                attempt = 0
+                while attempt < max_retries:
                     try:
-                        await message.answer_media_group(
-                            media=media_group,
-                            request_timeout=TIMEOUT_CAROUSEL,  # 20 минут для каруселей
-                        )
+                        # Альбом из N файлов Telegram считает как N сообщений
+                        async with tg_limiter.limit(cost=len(media_group)):
+                            await message.answer_media_group(
+                                media=media_group,
+                                request_timeout=TIMEOUT_CAROUSEL,  # 20 минут для каруселей
+                            )
                         break  # Success
+                    except TelegramRetryAfter as e:
+                        # Flood control: ждём сколько сказал Telegram, попытку не тратим.
+                        # FSInputFile читает файл заново при каждой отправке — альбом не пересобираем
+                        if flood_waits >= RETRY_AFTER_MAX_WAITS:
+                            logger.error(f"Carousel upload: flood control persists after {flood_waits} waits: {e}")
+                            raise
+                        flood_waits += 1
+                        tg_limiter.pause(e.retry_after)
+                        wait_time = e.retry_after + random.uniform(0, 1)
+                        logger.warning(f"Carousel upload: flood control, waiting {wait_time:.1f}s (retry_after={e.retry_after})")
+                        await asyncio.sleep(wait_time)
                     except (ConnectionResetError, ConnectionError, TimeoutError, Exception) as e:
-                        error_str = str(e).lower()
-                        if "closing transport" in error_str or "connection reset" in error_str or "timeout" in error_str:
+                        if CAROUSEL_RETRYABLE_RE.search(str(e)):
                             if attempt < max_retries - 1:
-                                wait_time = 5 * (2 ** attempt)  # 5s, 10s, 20s
-                                logger.warning(f"Carousel upload failed (attempt {attempt + 1}/{max_retries}): {e}. Retrying in {wait_time}s...")
+                                wait_time = _retry_delay(5 * (2 ** attempt))  # ~5s, 10s, 20s
+                                logger.warning(f"Carousel upload failed (attempt {attempt + 1}/{max_retries}): {e}. Retrying in {wait_time:.1f}s...")
                                 await asyncio.sleep(wait_time)
-                                # Recreate media group (streams might be consumed)
-                                media_group = []
-                                for i, file in enumerate(carousel.files):
-                                    input_file = FSInputFile(file.file_path, filename=file.filename)
-                                    caption = CAPTION if i == 0 else None
-                                    if file.is_photo:
-                                        media_group.append(InputMediaPhoto(media=input_file, caption=caption))
-                                    else:
-                                        # Извлекаем размеры и длительность для правильного отображения
-                                        width, height = get_video_dimensions(file.file_path)
-                                        duration = get_video_duration(file.file_path)
-                                        media_group.append(InputMediaVideo(
-                                            media=input_file,
-                                            caption=caption,
-                                            duration=duration if duration > 0 else None,
-                                            width=width if width > 0 else None,
-                                            height=height if height > 0 else None,
-                                            supports_streaming=True
-                                        ))
+                                attempt += 1
+                                # Recreate media group (streams might be consumed).
+                                # Пересоздаём только FSInputFile — ffprobe повторно не запускаем
+                                media_group = build_carousel_media_group(carousel.files, probes)
                             else:
                                 logger.error(f"Carousel upload failed after {max_retries} attempts: {e}")
                                 raise
@@ -777,13 +944,14 @@ async def handle_url(message: types.Message):
                         audio_result = await downloader.extract_audio(video_file.file_path)
                         if audio_result.success:
                             audio_file = FSInputFile(audio_result.file_path, filename=audio_result.filename)
-                            await message.answer_audio(
-                                audio=audio_file,
-                                caption=CAPTION,
-                                title=carousel.title[:60] if carousel.title else "audio",
-                                performer=carousel.author if carousel.author else None,
-                                request_timeout=TIMEOUT_AUDIO,  # 10 минут для аудио
-                            )
+                            async with tg_limiter.limit():
+                                await message.answer_audio(
+                                    audio=audio_file,
+                                    caption=CAPTION,
+                                    title=carousel.title[:60] if carousel.title else "audio",
+                                    performer=carousel.author if carousel.author else None,
+                                    request_timeout=TIMEOUT_AUDIO,  # 10 минут для аудио
+                                )
                             await log_action(user_id, "audio_extracted", {"platform": platform})
                             await downloader.cleanup(audio_result.file_path)
 
@@ -1017,26 +1185,15 @@ async def handle_url(message: types.Message):
 
                     # TikTok/Pinterest "флапают" — retry 1 раз для transient ошибок
                     error_str = ytdlp_result.error or ""
-                    error_lower = error_str.lower()
 
                     # НЕ ретраить если контент реально недоступен
-                    no_retry_keywords = [
-                        "private", "login", "sign in", "age", "region",
-                        "not available", "copyright", "removed", "deleted",
-                        "unavailable", "blocked", "restricted", "nsfw"
-                    ]
-                    is_permanent_error = any(kw in error_lower for kw in no_retry_keywords)
-
                     is_transient_error = (
                         platform in ("tiktok", "pinterest") and
-                        not is_permanent_error and
-                        ("unable to extract" in error_lower or
-                         "no video formats" in error_lower or
-                         "connection reset" in error_lower or
-                         "timed out" in error_lower)
+                        not YTDLP_PERMANENT_ERROR_RE.search(error_str) and
+                        YTDLP_TRANSIENT_ERROR_RE.search(error_str) is not None
                     )
                     if is_transient_error:
-                        logger.info(f"[{platform.upper()}] yt-dlp attempt=1 failed, retry_reason={error_lower[:50]}")
+                        logger.info(f"[{platform.upper()}] yt-dlp attempt=1 failed, retry_reason={error_str[:50].lower()}")
                         await asyncio.sleep(3)
                         ytdlp_result = await downloader.download(url, progress_callback=progress_callback)
                         if ytdlp_result.success:
@@ -1187,12 +1344,13 @@ async def handle_url(message: types.Message):
 
             # Гарантируем faststart (moov atom в начале) для корректного preview/duration
             # yt-dlp и pytubefix обычно уже делают это, но для RapidAPI нужно явно
-            ensure_faststart(result.file_path)
+            # ffmpeg/ffprobe/скачивание превью — синхронные subprocess/urllib вызовы,
+            # гоняем их в потоках, чтобы не останавливать event loop для остальных юзеров
+            await asyncio.to_thread(ensure_faststart, result.file_path)
 
-            # Извлекаем размеры и длительность для правильного отображения
+            # Извлекаем размеры и длительность для правильного отображения (один ffprobe)
             # duration в sendVideo - "железный" способ показать длительность (не зависит от moov atom)
-            width, height = get_video_dimensions(result.file_path)
-            duration = get_video_duration(result.file_path)
+            width, height, duration = await probe_video_async(result.file_path)
 
             # Скачиваем/используем thumbnail (превью)
             # Это даёт preview "как у конкурентов" вместо чёрного прямоугольника
@@ -1201,13 +1359,13 @@ async def handle_url(message: types.Message):
             if is_vertical:
                 # Вертикальное видео (Shorts, Reels, TikTok) - генерируем thumbnail из видео
                 # YouTube/платформы дают горизонтальные thumbnails которые выглядят растянуто
-                thumb_path = generate_thumbnail_from_video(result.file_path, timestamp=1.0)
+                thumb_path = await asyncio.to_thread(generate_thumbnail_from_video, result.file_path, 1.0)
                 logger.info(f"[THUMBNAIL] Generated from vertical video: {width}x{height}")
             elif result.info and result.info.thumbnail:
                 thumbnail_value = result.info.thumbnail
                 if thumbnail_value.startswith('http'):
                     # URL — скачиваем и ужимаем
-                    thumb_path = download_thumbnail(thumbnail_value)
+                    thumb_path = await asyncio.to_thread(download_thumbnail, thumbnail_value)
                 elif os.path.exists(thumbnail_value):
                     # Локальный файл (ffmpeg extracted) — используем напрямую
                     thumb_path = thumbnail_value
@@ -1251,7 +1409,7 @@ async def handle_url(message: types.Message):
             download_speed = int(file_size / total_ms * 1000 / 1024) if total_ms > 0 else 0
 
             # Phase 7.1 Telemetry: content bucket для аналитики по подтипам
-            if platform == "instagram" or platform.startswith("instagram_"):
+            if is_instagram:
                 # Для Instagram определяем тип из URL (reel/post/story)
                 content_bucket = detect_instagram_bucket(url)
             else:
@@ -1383,12 +1541,12 @@ async def handle_url(message: types.Message):
                     await instaloader_dl.cleanup(result.file_path)
                 else:
                     await downloader.cleanup(result.file_path)
-                logger.debug(f"[CLEANUP] Cleaned main file: {result.file_path}")
+                logger.debug("[CLEANUP] Cleaned main file: %s", result.file_path)
 
             # Чистим thumbnail
             if thumb_path and os.path.exists(thumb_path):
                 os.remove(thumb_path)
-                logger.debug(f"[CLEANUP] Cleaned thumbnail: {thumb_path}")
+                logger.debug("[CLEANUP] Cleaned thumbnail: %s", thumb_path)
 
         except Exception as cleanup_error:
             logger.warning(f"[CLEANUP] Error during cleanup: {cleanup_error}")
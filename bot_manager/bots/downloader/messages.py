@@ -17,6 +17,9 @@ BOT_ID = 1
 # TTL кэша в секундах
 CACHE_TTL = 60
 
+# Сколько отдаём последний удачно загруженный кэш, если БД недоступна
+CACHE_STALE_TTL = 3600
+
 # Подпись под медиа (не хранится в БД)
 CAPTION = "📥 Скачано через @SaveNinja_bot"
 
@@ -125,6 +128,7 @@ _messages_cache: dict[str, str] = {}
 _cache_loaded: bool = False
 _cache_loaded_at: float = 0  # timestamp последней загрузки
 _refresh_task: Optional[asyncio.Task] = None
+_stale_warned_at: float = float('-inf')  # monotonic время последнего warning о протухшем кэше
 
 
 async def load_messages_from_db(session) -> dict[str, str]:
@@ -151,8 +155,8 @@ async def load_messages_from_db(session) -> dict[str, str]:
         return _messages_cache
 
     except Exception as e:
-        logger.warning(f"Failed to load messages from DB: {e}, using defaults")
-        _cache_loaded = False
+        # Предыдущий кэш не сбрасываем — get_message отдаёт его как last known good
+        logger.warning(f"Failed to load messages from DB: {e}, keeping previous cache")
         return {}
 
 
@@ -199,17 +203,25 @@ def get_message(key: str, lang: str = "ru") -> str:
     """
     Получить сообщение по ключу.
     Сначала ищет в кэше БД, потом в дефолтах.
-    Проверяет TTL кэша - если протух, использует дефолты.
+    Если БД недоступна и кэш не обновляется — отдаёт последний удачно
+    загруженный текст (до CACHE_STALE_TTL), только потом дефолты.
     """
-    # Проверяем что кэш загружен и не протух
-    cache_age = time.time() - _cache_loaded_at if _cache_loaded_at > 0 else float('inf')
-    cache_is_valid = _cache_loaded and cache_age < CACHE_TTL * 2  # 2x TTL для запаса
+    global _stale_warned_at
 
-    if not cache_is_valid and _cache_loaded:
-        logger.warning(f"Messages cache expired (age={cache_age:.0f}s, TTL={CACHE_TTL}s), using defaults")
+    cache_age = time.time() - _cache_loaded_at if _cache_loaded_at > 0 else float('inf')
 
-    # Сначала из кэша БД (если не протух)
-    if cache_is_valid and key in _messages_cache:
+    if _cache_loaded and cache_age >= CACHE_TTL * 2:  # 2x TTL для запаса
+        # Кэш не обновлялся — предупреждаем не чаще раза в CACHE_TTL
+        now = time.monotonic()
+        if now - _stale_warned_at >= CACHE_TTL:
+            _stale_warned_at = now
+            if cache_age < CACHE_STALE_TTL:
+                logger.warning(f"Messages cache stale (age={cache_age:.0f}s, TTL={CACHE_TTL}s), serving last known good")
+            else:
+                logger.warning(f"Messages cache expired (age={cache_age:.0f}s, max={CACHE_STALE_TTL}s), using defaults")
+
+    # Сначала из кэша БД (если не протух окончательно)
+    if _cache_loaded and cache_age < CACHE_STALE_TTL and key in _messages_cache:
         return _messages_cache[key]
 
     # Fallback на дефолты
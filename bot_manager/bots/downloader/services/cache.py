@@ -4,9 +4,13 @@ Redis кэширование для видео file_id
 Telegram хранит file_id навсегда, поэтому один раз скачанное видео
 можно отправлять мгновенно по его file_id.
 """
+import asyncio
 import hashlib
 import logging
-from typing import Optional, Tuple
+import time
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Dict, Optional, Tuple
 
 import redis.asyncio as redis
 
@@ -17,43 +21,78 @@ logger = logging.getLogger(__name__)
 # Глобальный Redis клиент
 _redis: Optional[redis.Redis] = None
 
+# Lua-скрипты, зарегистрированные на клиенте (EVALSHA вместо EVAL с телом скрипта)
+_acquire_slot_script = None
+_decr_floor_script = None
+
 # TTL кэша (7 дней - file_id не протухают, но на всякий случай)
 CACHE_TTL = 7 * 24 * 60 * 60
 
+# Пул соединений: ограничен сверху, при исчерпании ждём свободное соединение
+# (BlockingConnectionPool), а не падаем с "Too many connections"
+REDIS_MAX_CONNECTIONS = 32
+REDIS_POOL_TIMEOUT = 5              # секунд ожидания свободного соединения
+REDIS_HEALTH_CHECK_INTERVAL = 30    # PING простаивающих соединений перед использованием
+
+# Локальный (in-process) кэш попаданий поверх Redis: вирусная ссылка, которую
+# кидают в десятки чатов, не превращается в десятки одинаковых MGET.
+# Кэшируем только попадания — промах через секунду может стать попаданием
+LOCAL_CACHE_TTL = 60          # секунд
+LOCAL_CACHE_MAXSIZE = 10_000  # URL; самые давние вытесняются (LRU)
+
+# url -> (monotonic expires_at, video_file_id, audio_file_id)
+_local_file_ids: "OrderedDict[str, Tuple[float, Optional[str], Optional[str]]]" = OrderedDict()
+# url -> текущий запрос в Redis (параллельные запросы одного URL ждут его же)
+_inflight_lookups: Dict[str, "asyncio.Future"] = {}
+
 
 async def get_redis() -> redis.Redis:
     """Получить Redis клиент (ленивая инициализация)"""
-    global _redis
+    global _redis, _acquire_slot_script, _decr_floor_script
     if _redis is None:
-        _redis = redis.from_url(
+        # Парсинг ответов на C через hiredis — redis-py подхватывает его сам, если установлен
+        pool = redis.BlockingConnectionPool.from_url(
             settings.redis_url,
             encoding="utf-8",
-            decode_responses=True
+            decode_responses=True,
+            max_connections=REDIS_MAX_CONNECTIONS,
+            timeout=REDIS_POOL_TIMEOUT,
+            health_check_interval=REDIS_HEALTH_CHECK_INTERVAL,
         )
+        _redis = redis.Redis(connection_pool=pool)
+        # register_script не ходит в сеть: SHA считается локально,
+        # при NOSCRIPT клиент сам сделает SCRIPT LOAD
+        _acquire_slot_script = _redis.register_script(ACQUIRE_SLOT_SCRIPT)
+        _decr_floor_script = _redis.register_script(DECR_FLOOR_SCRIPT)
     return _redis
 
 
+@lru_cache(maxsize=1024)
 def _url_hash(url: str) -> str:
     """Генерирует хэш URL для использования как ключ"""
     return hashlib.md5(url.encode()).hexdigest()
 
 
-async def get_cached_file_ids(url: str) -> Tuple[Optional[str], Optional[str]]:
-    """
-    Получить закэшированные file_id для URL
+def _remember_local(url: str, video_id: Optional[str], audio_id: Optional[str]) -> None:
+    """Положить попадание в локальный кэш (с вытеснением самых давних)"""
+    _local_file_ids[url] = (time.monotonic() + LOCAL_CACHE_TTL, video_id, audio_id)
+    _local_file_ids.move_to_end(url)
+    while len(_local_file_ids) > LOCAL_CACHE_MAXSIZE:
+        _local_file_ids.popitem(last=False)
 
-    Returns:
-        (video_file_id, audio_file_id) - оба или None
-    """
+
+async def _fetch_cached_file_ids(url: str) -> Tuple[Optional[str], Optional[str]]:
+    """Прочитать file_id из Redis (без локального кэша)"""
     try:
         r = await get_redis()
         url_hash = _url_hash(url)
 
-        video_id = await r.get(f"video:{url_hash}")
-        audio_id = await r.get(f"audio:{url_hash}")
+        # Оба ключа одним MGET (один round-trip вместо двух GET)
+        video_id, audio_id = await r.mget(f"video:{url_hash}", f"audio:{url_hash}")
 
         if video_id or audio_id:
             logger.info(f"Cache hit: video={bool(video_id)}, audio={bool(audio_id)}")
+            _remember_local(url, video_id, audio_id)
 
         return video_id, audio_id
     except Exception as e:
@@ -61,6 +100,33 @@ async def get_cached_file_ids(url: str) -> Tuple[Optional[str], Optional[str]]:
         return None, None
 
 
+async def get_cached_file_ids(url: str) -> Tuple[Optional[str], Optional[str]]:
+    """
+    Получить закэшированные file_id для URL
+
+    Сначала локальный кэш попаданий, затем Redis. Параллельные запросы
+    одного и того же URL делят один MGET.
+
+    Returns:
+        (video_file_id, audio_file_id) - оба или None
+    """
+    entry = _local_file_ids.get(url)
+    if entry is not None:
+        if entry[0] > time.monotonic():
+            _local_file_ids.move_to_end(url)
+            return entry[1], entry[2]
+        del _local_file_ids[url]
+
+    lookup = _inflight_lookups.get(url)
+    if lookup is None:
+        lookup = asyncio.ensure_future(_fetch_cached_file_ids(url))
+        _inflight_lookups[url] = lookup
+        lookup.add_done_callback(lambda _: _inflight_lookups.pop(url, None))
+
+    # shield: отмена одного ожидающего не должна отменять запрос для остальных
+    return await asyncio.shield(lookup)
+
+
 async def cache_file_ids(
     url: str,
     video_file_id: Optional[str] = None,
@@ -75,16 +141,24 @@ async def cache_file_ids(
         audio_file_id: Telegram file_id аудио
     """
     try:
+        if not video_file_id and not audio_file_id:
+            return
+
         r = await get_redis()
         url_hash = _url_hash(url)
 
-        if video_file_id:
-            await r.set(f"video:{url_hash}", video_file_id, ex=CACHE_TTL)
-            logger.debug(f"Cached video: {url_hash[:8]}...")
+        # Оба SET одним round-trip
+        async with r.pipeline(transaction=False) as pipe:
+            if video_file_id:
+                pipe.set(f"video:{url_hash}", video_file_id, ex=CACHE_TTL)
+            if audio_file_id:
+                pipe.set(f"audio:{url_hash}", audio_file_id, ex=CACHE_TTL)
+            await pipe.execute()
+
+        # Локальная копия могла устареть — следующий запрос перечитает Redis
+        _local_file_ids.pop(url, None)
 
-        if audio_file_id:
-            await r.set(f"audio:{url_hash}", audio_file_id, ex=CACHE_TTL)
-            logger.debug(f"Cached audio: {url_hash[:8]}...")
+        logger.debug("Cached video=%s, audio=%s: %.8s...", bool(video_file_id), bool(audio_file_id), url_hash)
 
     except Exception as e:
         logger.warning(f"Redis set error: {e}")
@@ -94,7 +168,8 @@ async def close_redis():
     """Закрыть Redis соединение"""
     global _redis
     if _redis:
-        await _redis.close()
+        # Пул передан явно — закрываем его вместе с клиентом
+        await _redis.close(close_connection_pool=True)
         _redis = None
 
 
@@ -122,6 +197,20 @@ else
 end
 """
 
+# Lua script для атомарного DECR с полом в нуле (один round-trip вместо DECR + SET)
+# Возвращает новое значение счётчика
+DECR_FLOOR_SCRIPT = """
+local key = KEYS[1]
+local ttl = tonumber(ARGV[1])
+
+local count = redis.call('DECR', key)
+if count < 0 then
+    redis.call('SET', key, 0, 'EX', ttl)
+    return 0
+end
+return count
+"""
+
 
 async def check_user_limit(user_id: int) -> bool:
     """
@@ -152,7 +241,7 @@ async def acquire_user_slot(user_id: int) -> bool:
         key = f"downloads:user:{user_id}"
 
         # Атомарная операция через Lua script
-        result = await r.eval(ACQUIRE_SLOT_SCRIPT, 1, key, MAX_USER_DOWNLOADS, 300)
+        result = await _acquire_slot_script(keys=[key], args=[MAX_USER_DOWNLOADS, 300], client=r)
         return result == 1
     except Exception as e:
         logger.warning(f"Acquire user slot error: {e}")
@@ -163,7 +252,8 @@ async def release_user_slot(user_id: int):
     """Освободить слот скачивания юзера"""
     try:
         r = await get_redis()
-        await r.decr(f"downloads:user:{user_id}")
+        # Не даём уйти в минус (иначе юзер получит лишние слоты)
+        await _decr_floor_script(keys=[f"downloads:user:{user_id}"], args=[300], client=r)
     except Exception as e:
         logger.warning(f"Release user slot error: {e}")
 
@@ -197,7 +287,7 @@ async def acquire_ffmpeg_slot() -> bool:
         key = "ffmpeg:active"
 
         # Атомарная операция через Lua script
-        result = await r.eval(ACQUIRE_SLOT_SCRIPT, 1, key, MAX_GLOBAL_FFMPEG, 600)
+        result = await _acquire_slot_script(keys=[key], args=[MAX_GLOBAL_FFMPEG, 600], client=r)
         return result == 1
     except Exception as e:
         logger.warning(f"Acquire ffmpeg slot error: {e}")
@@ -208,7 +298,7 @@ async def release_ffmpeg_slot():
     """Освободить слот ffmpeg процесса"""
     try:
         r = await get_redis()
-        await r.decr("ffmpeg:active")
+        await _decr_floor_script(keys=["ffmpeg:active"], args=[600], client=r)
     except Exception as e:
         logger.warning(f"Release ffmpeg slot error: {e}")
 
@@ -219,8 +309,11 @@ async def increment_active_downloads():
     """Увеличить счётчик активных скачиваний"""
     try:
         r = await get_redis()
-        await r.incr("counter:active_downloads")
-        await r.expire("counter:active_downloads", 300)  # TTL 5 минут
+        # INCR + EXPIRE одним round-trip
+        async with r.pipeline(transaction=False) as pipe:
+            pipe.incr("counter:active_downloads")
+            pipe.expire("counter:active_downloads", 300)  # TTL 5 минут
+            await pipe.execute()
     except Exception as e:
         logger.warning(f"Increment active downloads error: {e}")
 
@@ -229,10 +322,8 @@ async def decrement_active_downloads():
     """Уменьшить счётчик активных скачиваний"""
     try:
         r = await get_redis()
-        count = await r.decr("counter:active_downloads")
-        # Не даём уйти в минус
-        if count < 0:
-            await r.set("counter:active_downloads", "0", ex=300)
+        # Не даём уйти в минус (атомарно, одним round-trip)
+        await _decr_floor_script(keys=["counter:active_downloads"], args=[300], client=r)
     except Exception as e:
         logger.warning(f"Decrement active downloads error: {e}")
 
@@ -241,8 +332,11 @@ async def increment_active_uploads():
     """Увеличить счётчик активных загрузок в Telegram"""
     try:
         r = await get_redis()
-        await r.incr("counter:active_uploads")
-        await r.expire("counter:active_uploads", 300)
+        # INCR + EXPIRE одним round-trip
+        async with r.pipeline(transaction=False) as pipe:
+            pipe.incr("counter:active_uploads")
+            pipe.expire("counter:active_uploads", 300)
+            await pipe.execute()
     except Exception as e:
         logger.warning(f"Increment active uploads error: {e}")
 
@@ -251,8 +345,6 @@ async def decrement_active_uploads():
     """Уменьшить счётчик активных загрузок"""
     try:
         r = await get_redis()
-        count = await r.decr("counter:active_uploads")
-        if count < 0:
-            await r.set("counter:active_uploads", "0", ex=300)
+        await _decr_floor_script(keys=["counter:active_uploads"], args=[300], client=r)
     except Exception as e:
         logger.warning(f"Decrement active uploads error: {e}")
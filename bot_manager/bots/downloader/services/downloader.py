@@ -10,8 +10,10 @@
 import os
 import re
 import asyncio
+import functools
+import itertools
 import logging
-import uuid
+import time
 from dataclasses import dataclass, field
 from typing import Optional, List
 from concurrent.futures import ThreadPoolExecutor
@@ -45,8 +47,286 @@ DOWNLOAD_TIMEOUT = 120  # секунд (для обычных видео: Instag
 YOUTUBE_DOWNLOAD_TIMEOUT = 3600  # секунд (1 час для полных YouTube видео до 2GB, VPS throttling ~6MB/мин)
 AUDIO_BITRATE = "320"  # kbps
 
-# Пул потоков для синхронных операций yt-dlp
-_executor = ThreadPoolExecutor(max_workers=5)
+# Общие опции yt-dlp: качаем ровно один ролик и не тянем лишнего
+SINGLE_VIDEO_OPTS = {
+    'noplaylist': True,
+    'writesubtitles': False,
+    'writeautomaticsub': False,
+    'writethumbnail': False,
+    'writeinfojson': False,
+    'getcomments': False,
+}
+
+# Сетевые опции yt-dlp
+LONG_FORM_NET_OPTS = {
+    'socket_timeout': 60,
+    'retries': 10,  # Увеличено до 10 (для нестабильных VPS)
+    'fragment_retries': 20,  # Увеличено до 20 для фрагментов
+}
+AUDIO_NET_OPTS = {
+    'socket_timeout': 60,
+    'retries': 5,
+    'fragment_retries': 10,
+}
+
+
+def _short_form_retry_sleep(n: int) -> float:
+    """Экспоненциальная пауза между ретраями: 1, 2, 4, 4... секунд.
+
+    yt-dlp вызывает retry_sleep_functions с keyword-аргументом: sleep_func(n=...),
+    поэтому параметр обязан называться n.
+    """
+    return min(2 ** n, 4)
+
+
+# TikTok/Reels/Shorts/Pinterest (до 50MB): 10 сек тишины от сервера = сервер пропал,
+# лучше быстро переспросить, чем держать поток пула полторы минуты
+SHORT_FORM_NET_OPTS = {
+    'socket_timeout': 10,
+    'retries': 3,
+    'fragment_retries': 3,
+    'retry_sleep_functions': {
+        'http': _short_form_retry_sleep,
+        'fragment': _short_form_retry_sleep,
+    },
+}
+
+# Базовые опции yt-dlp для видео — общие для всех платформ
+BASE_VIDEO_OPTS = {
+    # Основные настройки
+    'quiet': True,
+    'no_warnings': True,
+    'noprogress': True,
+
+    # Контейнер после merge video+audio
+    'merge_output_format': 'mp4',
+
+    # Нужен только один ролик: без плейлистов (watch?v=...&list=...),
+    # сабов, превью и info.json
+    **SINGLE_VIDEO_OPTS,
+
+    # Не качаем заведомо слишком большие файлы: yt-dlp сверяет размер
+    # из метаданных формата / Content-Length до начала загрузки
+    'max_filesize': MAX_FILE_SIZE_BYTES,
+
+    # Сеть - оптимизация скорости.
+    # Короткие ролики: быстро падаем и пробуем снова / уходим в fallback
+    **SHORT_FORM_NET_OPTS,
+    'nocheckcertificate': True,
+    'geo_bypass': True,
+    'buffersize': 1024 * 64,  # 64KB буфер
+
+    # Для YouTube (переопределено ниже) НЕ используем concurrent downloads -
+    # это вызывает curl timeouts
+    'concurrent_fragment_downloads': 3,
+}
+
+# Переопределения под платформу (ключи — detect_platform()).
+# Каждая платформа получает только свои опции: format, клиенты, impersonate
+PLATFORM_VIDEO_OPTS = {
+    "tiktok": {
+        # H.264 форматы для TikTok (без проблем с SAR, лучше совместимость с Telegram)
+        'format': 'best[ext=mp4][vcodec^=avc]/best[ext=mp4][vcodec^=h264]/best[ext=mp4]/best',
+        # Имитация браузера (критично для TikTok, но НЕ для YouTube - вызывает curl timeout)
+        'impersonate': CHROME_TARGET,
+        'concurrent_fragment_downloads': 5,
+    },
+    "youtube_shorts": {
+        # YouTube Shorts - adaptive 720p (combined streams только 360p!)
+        # Shorts обычно вертикальные 1080x1920 или 720x1280
+        'format': 'bestvideo[height<=1080][ext=mp4]+bestaudio[ext=m4a]/bestvideo[height<=1080]+bestaudio',
+        'max_filesize': MAX_YOUTUBE_DOCUMENT_BYTES,
+        # tv+web клиенты для adaptive форматов (720p/1080p), ios/android дают только combined 360p!
+        'extractor_args': {'youtube': {'player_client': ['tv', 'web']}},
+    },
+    "youtube": {
+        # YouTube полные видео - ТОЛЬКО adaptive 720p (video+audio раздельно)
+        # НЕ используем combined streams (best) - они только до 360p
+        # Если adaptive недоступен - пусть yt-dlp fails и pytubefix возьмёт на себя
+        'format': 'bestvideo[height<=720][ext=mp4]+bestaudio[ext=m4a]/bestvideo[height<=720]+bestaudio',
+        'max_filesize': MAX_YOUTUBE_DOCUMENT_BYTES,
+        # Долгие таймауты и много ретраев (нестабильные VPS, throttling), без коротких пауз
+        **LONG_FORM_NET_OPTS,
+        'retry_sleep_functions': {},
+        # web client может быть ограничен SABR streaming, используем tv + android + web
+        # tv client часто даёт доступ к adaptive форматам без ограничений
+        'extractor_args': {'youtube': {'player_client': ['tv', 'android', 'web']}},
+        # Минимальная скорость 100KB/s - помогает обойти throttling
+        'throttledratelimit': 100 * 1024,
+        # Скачиваем последовательно для стабильности
+        'concurrent_fragment_downloads': 1,
+    },
+    "pinterest": {
+        # Pinterest видео - пробуем все возможные форматы (HLS, mp4, webm)
+        'format': 'best[ext=mp4]/best[ext=webm]/bestvideo+bestaudio/best',
+    },
+    "other": {
+        'format': 'best[ext=mp4]/best',
+    },
+}
+
+# Аудиокодеки, которые отдаём как есть (stream copy): codec_name из ffprobe -> расширение
+AUDIO_STREAM_COPY_EXT = {
+    'mp3': 'mp3',
+    'aac': 'm4a',
+}
+
+# Регулярки для Pinterest фото (компилируем один раз)
+PINTEREST_OG_IMAGE_PATTERNS = (
+    re.compile(r'<meta[^>]*property="og:image"[^>]*content="([^"]+)"'),
+    re.compile(r'<meta[^>]*content="([^"]+)"[^>]*property="og:image"'),
+)
+PINTEREST_ORIGINALS_RE = re.compile(
+    r'https://i\.pinimg\.com/originals/([a-f0-9]{2}/[a-f0-9]{2}/[a-f0-9]{2}/[a-f0-9]+\.(?:jpg|png|webp))'
+)
+
+# Уникальные имена файлов: pid + время старта процесса + счётчик.
+# Время старта нужно, чтобы после рестарта контейнера (тот же pid) не совпасть
+# с недочищенными файлами прошлого запуска. next() у itertools.count атомарен под GIL
+_FILE_PREFIX = f"{os.getpid()}_{int(time.time())}"
+_file_counter = itertools.count()
+
+# Всё, кроме букв/цифр (включая кириллицу), пробела, '-' и '_' — вырезаем из имени файла
+UNSAFE_FILENAME_CHARS_RE = re.compile(r'[^\w \-]')
+
+# Определение платформы по URL: одна регулярка с именованными группами вместо
+# пачки `in url.lower()`. Порядок групп важен: shorts раньше обычного YouTube
+PLATFORM_RE = re.compile(
+    r'(?P<tiktok>tiktok)'
+    r'|(?P<youtube_shorts>youtube\.com/shorts/)'
+    r'|(?P<youtube>youtube\.com|youtu\.be)'
+    r'|(?P<pinterest>pinterest|pin\.it)',
+    re.IGNORECASE
+)
+
+
+def detect_platform(url: str) -> str:
+    """
+    Платформа для выбора опций yt-dlp.
+
+    Returns:
+        'tiktok' | 'youtube_shorts' | 'youtube' | 'pinterest' | 'other'
+    """
+    match = PLATFORM_RE.search(url)
+    return match.lastgroup if match else "other"
+
+
+# Человеческие сообщения для ошибок yt-dlp: (ключ, сообщение), порядок = приоритет.
+# '_' в ключе совпадает и с пробелом в тексте ошибки
+ERROR_MESSAGES = (
+    ("removed", "❌ Видео удалено"),
+    ("terminated", "❌ Видео удалено"),
+    ("private", "🔒 Это приватное видео"),
+    ("unavailable", "❌ Видео недоступно"),
+    ("not_available", "❌ Видео недоступно"),
+    ("age_restricted", "🔞 Видео 18+"),
+    ("copyright", "©️ Видео заблокировано по авторским правам"),
+    ("live", "📺 Это прямая трансляция, не могу скачать"),
+    ("streaming", "📺 Это прямая трансляция, не могу скачать"),
+    ("members_only", "💎 Видео недоступно для скачивания"),
+    ("members-only", "💎 Видео недоступно для скачивания"),
+    ("subscription", "💎 Видео недоступно для скачивания"),
+    ("timeout", "⏱ Превышено время ожидания, попробуй позже"),
+    ("timed_out", "⏱ Сервер не отвечает, попробуй ещё раз"),
+    ("connection_timed_out", "⏱ Сервер не отвечает, попробуй ещё раз"),
+    ("not_found", "❌ Видео не найдено"),
+    ("network", "🌐 Ошибка сети, попробуй позже"),
+    ("connection", "🌐 Ошибка сети, попробуй позже"),
+    ("geo_restricted", "❌ Видео недоступно в вашем регионе"),
+    ("country", "❌ Видео недоступно в вашем регионе"),
+    ("rate_limit", "⏱ Слишком много запросов, попробуй через минуту"),
+    ("login_required", "Instagram требует авторизации для этого контента"),
+    ("sign_in", "Instagram требует авторизации для этого контента"),
+    ("authentication", "Instagram требует авторизации для этого контента"),
+)
+
+# Все ключи одной регуляркой: группа N = ключ N. Lookahead (?=...) проверяет
+# каждую позицию, поэтому находятся и перекрывающиеся ключи. '_' в ключе
+# матчит и пробел, и '_'; регистр игнорируем — без error.lower() копии
+ERROR_MESSAGES_RE = re.compile(
+    '(?=' + '|'.join(f"({re.escape(key).replace('_', '[ _]')})" for key, _ in ERROR_MESSAGES) + ')',
+    re.IGNORECASE
+)
+
+
+@functools.lru_cache(maxsize=256)
+def format_download_error(error: str) -> str:
+    """
+    Форматирует сообщение об ошибке для пользователя.
+
+    Ошибки повторяются (приватные/удалённые видео), поэтому результат кэшируем.
+    """
+    # Один проход регуляркой; из всех найденных ключей берём самый приоритетный
+    # (первый в ERROR_MESSAGES) — как при последовательной проверке
+    best = None
+    for match in ERROR_MESSAGES_RE.finditer(error):
+        if best is None or match.lastindex < best:
+            best = match.lastindex
+            if best == 1:
+                break
+
+    if best is not None:
+        return ERROR_MESSAGES[best - 1][1]
+
+    # Если ошибка не распознана - возвращаем первые 100 символов
+    return error[:100] if len(error) > 100 else error
+
+
+# Пул потоков для синхронных операций yt-dlp.
+# yt-dlp почти всё время ждёт сеть, поэтому потоков больше, чем ядер;
+# нагрузку на каждый сайт ограничивают семафоры ниже
+YTDLP_MAX_WORKERS = 16
+_executor = ThreadPoolExecutor(max_workers=YTDLP_MAX_WORKERS, thread_name_prefix="ytdlp")
+
+# Лимит одновременных yt-dlp скачиваний на хост (чтобы не ловить rate-limit/бан IP)
+HOST_CONCURRENCY = {
+    "youtube": 4,
+    "tiktok": 6,
+    "pinterest": 4,
+    "other": 6,
+}
+# youtube_shorts и youtube — один хост
+_PLATFORM_HOST = {"youtube_shorts": "youtube"}
+_host_semaphores = {host: asyncio.Semaphore(limit) for host, limit in HOST_CONCURRENCY.items()}
+
+
+def _get_host_semaphore(platform: str) -> asyncio.Semaphore:
+    """Семафор хоста для платформы из detect_platform()"""
+    return _host_semaphores[_PLATFORM_HOST.get(platform, platform)]
+
+
+async def _run_host_limited(platform: str, timeout: float, func, *args):
+    """
+    Выполнить func(*args) в _executor под семафором хоста, с таймаутом.
+
+    Слот хоста освобождается, когда поток РЕАЛЬНО закончил, а не когда
+    сработал таймаут: wait_for не умеет останавливать поток, и yt-dlp
+    продолжает качать с того же хоста. Если отпускать слот на таймауте,
+    каждый таймаут добавлял бы хосту лишнее соединение сверх HOST_CONCURRENCY.
+
+    Raises:
+        asyncio.TimeoutError: если не уложились в timeout (поток доработает сам)
+    """
+    semaphore = _get_host_semaphore(platform)
+    await semaphore.acquire()
+    loop = asyncio.get_running_loop()
+
+    def _release(_):
+        # Колбэк вызывается в потоке executor'а — отпускаем слот из event loop
+        try:
+            loop.call_soon_threadsafe(semaphore.release)
+        except RuntimeError:
+            pass  # loop уже закрыт (остановка процесса)
+
+    try:
+        future = _executor.submit(func, *args)
+    except BaseException:
+        semaphore.release()
+        raise
+    # Срабатывает и при отмене ещё не начатой задачи (таймаут в очереди executor'а)
+    future.add_done_callback(_release)
+
+    return await asyncio.wait_for(asyncio.wrap_future(future), timeout=timeout)
 
 
 @dataclass
@@ -93,94 +373,24 @@ class VideoDownloader:
         """Инициализация загрузчика"""
         os.makedirs(DOWNLOAD_DIR, exist_ok=True)
 
-    def _get_video_options(self, output_path: str, url: str = "", progress_hook=None) -> dict:
-        """Опции yt-dlp для скачивания видео (оптимизировано для скорости)"""
-
-        # Для TikTok предпочитаем H.264 (лучше совместимость с Telegram)
-        is_tiktok = 'tiktok' in url.lower()
-        # YouTube: определяем Shorts vs Full
-        is_youtube = 'youtube.com' in url.lower() or 'youtu.be' in url.lower()
-        is_youtube_shorts = is_youtube and '/shorts/' in url.lower()
-        is_youtube_full = is_youtube and not is_youtube_shorts
-        # Для Pinterest пробуем все форматы (HLS, mp4, любые)
-        is_pinterest = 'pinterest' in url.lower() or 'pin.it' in url.lower()
-
-        if is_tiktok:
-            # H.264 форматы для TikTok (без проблем с SAR)
-            format_string = 'best[ext=mp4][vcodec^=avc]/best[ext=mp4][vcodec^=h264]/best[ext=mp4]/best'
-        elif is_youtube_shorts:
-            # YouTube Shorts - adaptive 720p (combined streams только 360p!)
-            # Shorts обычно вертикальные 1080x1920 или 720x1280
-            format_string = 'bestvideo[height<=1080][ext=mp4]+bestaudio[ext=m4a]/bestvideo[height<=1080]+bestaudio'
-        elif is_youtube_full:
-            # YouTube полные видео - ТОЛЬКО adaptive 720p (video+audio раздельно)
-            # НЕ используем combined streams (best) - они только до 360p
-            # Если adaptive недоступен - пусть yt-dlp fails и pytubefix возьмёт на себя
-            format_string = 'bestvideo[height<=720][ext=mp4]+bestaudio[ext=m4a]/bestvideo[height<=720]+bestaudio'
-        elif is_pinterest:
-            # Pinterest видео - пробуем все возможные форматы (HLS, mp4, webm)
-            format_string = 'best[ext=mp4]/best[ext=webm]/bestvideo+bestaudio/best'
-        else:
-            format_string = 'best[ext=mp4]/best'
-
-        # Выбираем socket_timeout в зависимости от платформы
-        socket_timeout = 60 if is_youtube_full else 30
-
-        opts = {
-            # Основные настройки
-            'quiet': True,
-            'no_warnings': True,
-            'noprogress': True,
-
-            # Формат: быстрое скачивание - берём готовый mp4, не merge
-            'format': format_string,
-            'merge_output_format': 'mp4',
-
-            # Путь сохранения
-            'outtmpl': output_path,
-
-            # Сеть - оптимизация скорости
-            'socket_timeout': socket_timeout,  # 60 для YouTube Full, 30 для остальных
-            'retries': 10,  # Увеличено до 10 (для нестабильных VPS)
-            'fragment_retries': 20,  # Увеличено до 20 для фрагментов
-            'nocheckcertificate': True,
-            'geo_bypass': True,
-            'buffersize': 1024 * 64,  # 64KB буфер
-
-            # YouTube: дефолтные клиенты (переопределяются ниже для Shorts/Full)
-            'extractor_args': {
-                'youtube': {'player_client': ['ios', 'android']},
-            },
-        }
+    def _get_video_options(self, output_path: str, platform: str = "other", progress_hook=None) -> dict:
+        """
+        Опции yt-dlp для скачивания видео (оптимизировано для скорости)
 
-        # Имитация браузера (критично для TikTok, но НЕ для YouTube - вызывает curl timeout)
-        if is_tiktok:
-            opts['impersonate'] = CHROME_TARGET
-            opts['concurrent_fragment_downloads'] = 5
+        Args:
+            output_path: Путь сохранения
+            platform: Результат detect_platform(url) — выбирает набор переопределений
+            progress_hook: Опциональный hook прогресса yt-dlp
+        """
+        opts = BASE_VIDEO_OPTS.copy()
+        opts.update(PLATFORM_VIDEO_OPTS.get(platform, PLATFORM_VIDEO_OPTS["other"]))
+        opts['outtmpl'] = output_path
 
-        # Для YouTube Shorts: используем tv+web клиенты для adaptive форматов (720p/1080p)
-        # ios/android дают только combined 360p!
-        if is_youtube_shorts:
-            opts['extractor_args'] = {'youtube': {'player_client': ['tv', 'web']}}
+        if platform == "youtube_shorts":
             logger.info(f"[YTDLP] Using tv+web clients for YouTube Shorts (adaptive 1080p)")
-
-        # Для YouTube Full: используем несколько клиентов для надёжности
-        if is_youtube_full:
-            # web client может быть ограничен SABR streaming, используем tv + android + web
-            # tv client часто даёт доступ к adaptive форматам без ограничений
-            opts['extractor_args'] = {'youtube': {'player_client': ['tv', 'android', 'web']}}
+        elif platform == "youtube":
             logger.info(f"[YTDLP] Using tv+android+web clients for YouTube Full (720p adaptive)")
 
-            # Минимальная скорость 100KB/s - помогает обойти throttling
-            opts['throttledratelimit'] = 100 * 1024  # 100KB/s
-            # Альтернатива: ограничение скорости 1MB/s (парадоксально, но может ускорить)
-            # opts['ratelimit'] = 1024 * 1024  # 1MB/s
-
-        # Для YouTube НЕ используем concurrent downloads - это вызывает curl timeouts
-        # Скачиваем последовательно для стабильности
-        if not is_youtube_full and not is_tiktok:
-            opts['concurrent_fragment_downloads'] = 3
-
         # Добавляем progress_hooks если передан
         if progress_hook:
             opts['progress_hooks'] = [progress_hook]
@@ -189,7 +399,9 @@ class VideoDownloader:
 
     def _get_audio_options(self, output_path: str, url: str = "") -> dict:
         """Опции yt-dlp для извлечения аудио (MP3 320kbps)"""
-        is_tiktok = 'tiktok' in url.lower()
+        platform = detect_platform(url)
+        is_tiktok = platform == "tiktok"
+        is_youtube_full = platform == "youtube"
 
         opts = {
             'quiet': True,
@@ -198,6 +410,7 @@ class VideoDownloader:
 
             'format': 'bestaudio/best',
             'outtmpl': output_path,
+            **SINGLE_VIDEO_OPTS,
 
             # Конвертация в MP3 320kbps
             'postprocessors': [{
@@ -206,9 +419,7 @@ class VideoDownloader:
                 'preferredquality': AUDIO_BITRATE,
             }],
 
-            'socket_timeout': 60,  # Увеличено с 30 до 60
-            'retries': 5,
-            'fragment_retries': 10,
+            **(AUDIO_NET_OPTS if is_youtube_full else SHORT_FORM_NET_OPTS),
             'nocheckcertificate': True,
             'geo_bypass': True,
 
@@ -225,8 +436,7 @@ class VideoDownloader:
 
     def _generate_filepath(self, ext: str = "mp4") -> str:
         """Генерирует уникальный путь к файлу"""
-        unique_id = str(uuid.uuid4())[:12]
-        return os.path.join(DOWNLOAD_DIR, f"{unique_id}.{ext}")
+        return os.path.join(DOWNLOAD_DIR, f"{_FILE_PREFIX}_{next(_file_counter)}.{ext}")
 
     def _extract_info(self, info: dict) -> MediaInfo:
         """Извлекает информацию из ответа yt-dlp"""
@@ -240,7 +450,7 @@ class VideoDownloader:
 
     def _sanitize_filename(self, title: str, ext: str) -> str:
         """Очищает название для использования как имя файла"""
-        safe = "".join(c for c in title if c.isalnum() or c in ' -_').strip()
+        safe = UNSAFE_FILENAME_CHARS_RE.sub('', title).strip()
         safe = safe[:50] if safe else "video"
         return f"{safe}.{ext}"
 
@@ -266,23 +476,20 @@ class VideoDownloader:
                 except Exception:
                     pass  # Игнорируем ошибки callback
 
-        opts = self._get_video_options(output_path, url, progress_hook)
+        platform = detect_platform(url)
+        opts = self._get_video_options(output_path, platform, progress_hook)
 
         try:
             loop = asyncio.get_running_loop()
 
             # Выбираем таймаут в зависимости от платформы
-            is_youtube_full = ('youtube.com' in url.lower() or 'youtu.be' in url.lower()) and '/shorts/' not in url.lower()
-            timeout = YOUTUBE_DOWNLOAD_TIMEOUT if is_youtube_full else DOWNLOAD_TIMEOUT
+            timeout = YOUTUBE_DOWNLOAD_TIMEOUT if platform == "youtube" else DOWNLOAD_TIMEOUT
 
-            result = await asyncio.wait_for(
-                loop.run_in_executor(_executor, self._download_sync, url, opts, False),
-                timeout=timeout
-            )
+            result = await _run_host_limited(platform, timeout, self._download_sync, url, opts, False)
 
             # Если ошибка "No video formats" для Pinterest - пробуем как фото
             if not result.success and result.error:
-                is_pinterest = 'pinterest' in url or 'pin.it' in url
+                is_pinterest = platform == "pinterest"
                 is_no_video = 'no video' in result.error.lower() or 'video formats' in result.error.lower()
 
                 if is_pinterest and is_no_video:
@@ -298,16 +505,15 @@ class VideoDownloader:
                 # Rate limiting для ffmpeg процессов
                 if RATE_LIMITING_ENABLED:
                     # Ожидаем освобождения слота с таймаутом (макс 30 сек)
-                    ffmpeg_wait_start = asyncio.get_event_loop().time()
+                    ffmpeg_wait_start = loop.time()
                     ffmpeg_timeout = 30  # секунд
                     while not await acquire_ffmpeg_slot():
-                        if asyncio.get_event_loop().time() - ffmpeg_wait_start > ffmpeg_timeout:
+                        if loop.time() - ffmpeg_wait_start > ffmpeg_timeout:
                             logger.warning("[FFMPEG] Timeout waiting for slot, proceeding anyway")
                             break
                         await asyncio.sleep(0.5)  # Ждём 500ms и пробуем снова
 
                 try:
-                    loop = asyncio.get_running_loop()
                     await loop.run_in_executor(_executor, fix_video, result.file_path)
                     # Обновляем размер после исправления
                     if os.path.exists(result.file_path):
@@ -317,7 +523,7 @@ class VideoDownloader:
                         await release_ffmpeg_slot()
 
             # Проверяем размер файла
-            is_youtube = 'youtube.com' in url.lower() or 'youtu.be' in url.lower()
+            is_youtube = platform in ("youtube", "youtube_shorts")
 
             if is_youtube:
                 # Для YouTube разрешаем до 2GB
@@ -368,11 +574,8 @@ class VideoDownloader:
         opts = self._get_audio_options(output_template, url)
 
         try:
-            loop = asyncio.get_running_loop()
-
-            result = await asyncio.wait_for(
-                loop.run_in_executor(_executor, self._download_sync, url, opts, True),
-                timeout=DOWNLOAD_TIMEOUT
+            result = await _run_host_limited(
+                detect_platform(url), DOWNLOAD_TIMEOUT, self._download_sync, url, opts, True
             )
 
             if not result.success:
@@ -402,7 +605,6 @@ class VideoDownloader:
 
     def _download_sync(self, url: str, opts: dict, is_audio: bool = False) -> DownloadResult:
         """Синхронная загрузка (выполняется в thread pool)"""
-        import time
         start_time = time.time()
         last_log_time = start_time
 
@@ -442,9 +644,19 @@ class VideoDownloader:
                         error="Не удалось получить информацию о видео"
                     )
 
-                file_path = self._find_downloaded_file(info, opts, is_audio)
+                file_path = self._find_downloaded_file(info, opts, is_audio, ydl)
 
                 if not file_path or not os.path.exists(file_path):
+                    # yt-dlp молча пропускает загрузку, если размер больше max_filesize
+                    max_filesize = opts.get('max_filesize')
+                    expected_size = info.get('filesize') or info.get('filesize_approx') or 0
+                    if max_filesize and expected_size > max_filesize:
+                        logger.warning(f"[DOWNLOAD] Skipped oversize file: {expected_size} > {max_filesize}")
+                        return DownloadResult(
+                            success=False,
+                            error=f"Файл слишком большой ({expected_size // 1024 // 1024}MB > {max_filesize // 1024 // 1024}MB)"
+                        )
+
                     logger.error(f"[DOWNLOAD] File not found after download")
                     return DownloadResult(
                         success=False,
@@ -482,7 +694,7 @@ class VideoDownloader:
                 error=self._format_error(str(e))
             )
 
-    def _find_downloaded_file(self, info: dict, opts: dict, is_audio: bool) -> Optional[str]:
+    def _find_downloaded_file(self, info: dict, opts: dict, is_audio: bool, ydl=None) -> Optional[str]:
         """Находит скачанный файл"""
         # Способ 1: из requested_downloads
         if 'requested_downloads' in info and info['requested_downloads']:
@@ -490,7 +702,16 @@ class VideoDownloader:
             if filepath and os.path.exists(filepath):
                 return filepath
 
-        # Способ 2: по шаблону
+        # Способ 2: имя, которое yt-dlp вычисляет из уже полученного info_dict
+        # (без повторной экстракции). Аудио после FFmpegExtractAudio — всегда .mp3
+        if ydl is not None:
+            filepath = ydl.prepare_filename(info)
+            if is_audio:
+                filepath = os.path.splitext(filepath)[0] + '.mp3'
+            if os.path.exists(filepath):
+                return filepath
+
+        # Способ 3: по шаблону
         template = opts.get('outtmpl', '')
         if template:
             base = template.replace('.%(ext)s', '').replace('%(ext)s', '')
@@ -502,61 +723,104 @@ class VideoDownloader:
 
         return None
 
+    async def _probe_audio_codec(self, video_path: str) -> Optional[str]:
+        """Кодек первой аудиодорожки (ffprobe), None если не удалось определить"""
+        try:
+            process = await asyncio.create_subprocess_exec(
+                'ffprobe', '-v', 'error',
+                '-select_streams', 'a:0',
+                '-show_entries', 'stream=codec_name',
+                '-of', 'default=noprint_wrappers=1:nokey=1',
+                video_path,
+                stdin=asyncio.subprocess.DEVNULL,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.DEVNULL,
+            )
+            try:
+                stdout, _ = await asyncio.wait_for(process.communicate(), timeout=15)
+            except asyncio.TimeoutError:
+                # wait_for не убивает процесс — добиваем и забираем, чтобы не висел зомби
+                process.kill()
+                await process.wait()
+                logger.debug(f"[FFPROBE] Audio codec probe timed out: {video_path}")
+                return None
+            codec = stdout.decode(errors='replace').strip().lower()
+            return codec or None
+        except Exception as e:
+            logger.debug(f"[FFPROBE] Audio codec probe failed: {e}")
+            return None
+
+    async def _run_ffmpeg_audio(self, video_path: str, output_path: str, codec_args: List[str]) -> bool:
+        """Один прогон ffmpeg для извлечения аудио. Таймаут — asyncio.TimeoutError"""
+        process = await asyncio.create_subprocess_exec(
+            'ffmpeg', '-i', video_path,
+            '-vn',  # Без видео
+            *codec_args,
+            '-y',  # Перезаписать
+            output_path,
+            stdin=asyncio.subprocess.DEVNULL,
+            stdout=asyncio.subprocess.DEVNULL,
+            stderr=asyncio.subprocess.PIPE,
+        )
+        try:
+            _, stderr = await asyncio.wait_for(process.communicate(), timeout=180)
+        except asyncio.TimeoutError:
+            process.kill()
+            await process.wait()
+            raise
+
+        if process.returncode != 0:
+            logger.warning(f"[FFMPEG] Audio extraction failed: {stderr.decode(errors='replace')[-300:]}")
+            return False
+        return os.path.exists(output_path)
+
     async def extract_audio(self, video_path: str) -> DownloadResult:
         """
         Извлекает аудио из уже скачанного видео (быстро через ffmpeg)
 
+        Если дорожка уже AAC/MP3 — копируем её без перекодирования
+        (AAC кладём в .m4a, Telegram принимает его как аудио).
+        Иначе — перекодируем в MP3 320kbps.
+
         Args:
             video_path: Путь к видеофайлу
 
         Returns:
-            DownloadResult с путём к MP3 файлу
+            DownloadResult с путём к аудиофайлу
         """
-        import subprocess
-
         if not os.path.exists(video_path):
             return DownloadResult(
                 success=False,
                 error="Видеофайл не найден"
             )
 
-        output_path = video_path.rsplit('.', 1)[0] + ".mp3"
+        base_path = video_path.rsplit('.', 1)[0]
 
         try:
-            loop = asyncio.get_running_loop()
+            attempts = []
+            copy_ext = AUDIO_STREAM_COPY_EXT.get(await self._probe_audio_codec(video_path))
+            if copy_ext:
+                attempts.append((copy_ext, ['-c:a', 'copy']))
+            attempts.append(('mp3', ['-acodec', 'libmp3lame', '-ab', f'{AUDIO_BITRATE}k', '-ar', '44100']))
+
+            for ext, codec_args in attempts:
+                output_path = f"{base_path}.{ext}"
+                if await self._run_ffmpeg_audio(video_path, output_path, codec_args):
+                    if codec_args[-1] == 'copy':
+                        logger.info(f"[FFMPEG] Audio stream copied without re-encode ({ext})")
+                    return DownloadResult(
+                        success=True,
+                        file_path=output_path,
+                        filename=f"audio.{ext}",
+                        file_size=os.path.getsize(output_path)
+                    )
+                await self.cleanup(output_path)
 
-            def _extract():
-                cmd = [
-                    'ffmpeg', '-i', video_path,
-                    '-vn',  # Без видео
-                    '-acodec', 'libmp3lame',
-                    '-ab', f'{AUDIO_BITRATE}k',
-                    '-ar', '44100',
-                    '-y',  # Перезаписать
-                    output_path
-                ]
-                result = subprocess.run(cmd, capture_output=True, timeout=180)
-                return result.returncode == 0
-
-            success = await asyncio.wait_for(
-                loop.run_in_executor(_executor, _extract),
-                timeout=180
+            return DownloadResult(
+                success=False,
+                error="Ошибка извлечения аудио"
             )
 
-            if success and os.path.exists(output_path):
-                file_size = os.path.getsize(output_path)
-                return DownloadResult(
-                    success=True,
-                    file_path=output_path,
-                    filename="audio.mp3",
-                    file_size=file_size
-                )
-            else:
-                return DownloadResult(
-                    success=False,
-                    error="Ошибка извлечения аудио"
-                )
-
         except asyncio.TimeoutError:
             return DownloadResult(
                 success=False,
@@ -571,53 +835,22 @@ class VideoDownloader:
 
     def _format_error(self, error: str) -> str:
         """Форматирует сообщение об ошибке для пользователя"""
-        error_lower = error.lower()
-
-        # Словарь человеческих ошибок
-        ERROR_MESSAGES = {
-            "removed": "❌ Видео удалено",
-            "terminated": "❌ Видео удалено",
-            "private": "🔒 Это приватное видео",
-            "unavailable": "❌ Видео недоступно",
-            "not_available": "❌ Видео недоступно",
-            "age_restricted": "🔞 Видео 18+",
-            "copyright": "©️ Видео заблокировано по авторским правам",
-            "live": "📺 Это прямая трансляция, не могу скачать",
-            "streaming": "📺 Это прямая трансляция, не могу скачать",
-            "members_only": "💎 Видео недоступно для скачивания",
-            "members-only": "💎 Видео недоступно для скачивания",
-            "subscription": "💎 Видео недоступно для скачивания",
-            "timeout": "⏱ Превышено время ожидания, попробуй позже",
-            "timed_out": "⏱ Сервер не отвечает, попробуй ещё раз",
-            "connection_timed_out": "⏱ Сервер не отвечает, попробуй ещё раз",
-            "not_found": "❌ Видео не найдено",
-            "network": "🌐 Ошибка сети, попробуй позже",
-            "connection": "🌐 Ошибка сети, попробуй позже",
-            "geo_restricted": "❌ Видео недоступно в вашем регионе",
-            "country": "❌ Видео недоступно в вашем регионе",
-            "rate_limit": "⏱ Слишком много запросов, попробуй через минуту",
-            "login_required": "Instagram требует авторизации для этого контента",
-            "sign_in": "Instagram требует авторизации для этого контента",
-            "authentication": "Instagram требует авторизации для этого контента",
-        }
+        return format_download_error(error)
 
-        # Проверяем каждый ключ ошибки
-        for key, message in ERROR_MESSAGES.items():
-            if key in error_lower.replace(" ", "_"):
-                return message
-
-        # Если ошибка не распознана - возвращаем первые 100 символов
-        return error[:100] if len(error) > 100 else error
+    @staticmethod
+    def _remove_file(path: str):
+        """Удаляет один файл (выполняется в потоке)"""
+        try:
+            os.remove(path)
+            logger.debug("Removed: %s", path)
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logger.warning(f"Failed to remove {path}: {e}")
 
     async def cleanup(self, *paths: str):
-        """Удаляет файлы после отправки"""
-        for path in paths:
-            if path and os.path.exists(path):
-                try:
-                    os.remove(path)
-                    logger.debug(f"Removed: {path}")
-                except Exception as e:
-                    logger.warning(f"Failed to remove {path}: {e}")
+        """Удаляет файлы после отправки (unlink в потоках, не блокируя event loop)"""
+        await asyncio.gather(*(asyncio.to_thread(self._remove_file, path) for path in paths if path))
 
     async def download_photo(self, url: str) -> DownloadResult:
         """
@@ -630,7 +863,7 @@ class VideoDownloader:
             loop = asyncio.get_running_loop()
 
             # Определяем платформу
-            if 'pinterest' in url or 'pin.it' in url:
+            if detect_platform(url) == "pinterest":
                 result = await asyncio.wait_for(
                     loop.run_in_executor(_executor, self._download_pinterest_photo, url),
                     timeout=DOWNLOAD_TIMEOUT
@@ -666,12 +899,8 @@ class VideoDownloader:
             image_url = None
 
             # Способ 1: og:image (самый надёжный)
-            og_patterns = [
-                r'<meta[^>]*property="og:image"[^>]*content="([^"]+)"',
-                r'<meta[^>]*content="([^"]+)"[^>]*property="og:image"',
-            ]
-            for pattern in og_patterns:
-                match = re.search(pattern, response.text)
+            for pattern in PINTEREST_OG_IMAGE_PATTERNS:
+                match = pattern.search(response.text)
                 if match:
                     image_url = match.group(1)
                     logger.info(f"Pinterest og:image found: {image_url}")
@@ -691,10 +920,7 @@ class VideoDownloader:
 
             # Способ 2: ищем в JSON данных (исключая placeholder d5/3b/01)
             if not image_url:
-                all_originals = re.findall(
-                    r'https://i\.pinimg\.com/originals/([a-f0-9]{2}/[a-f0-9]{2}/[a-f0-9]{2}/[a-f0-9]+\.(?:jpg|png|webp))',
-                    response.text
-                )
+                all_originals = PINTEREST_ORIGINALS_RE.findall(response.text)
                 # Фильтруем placeholder
                 real_images = [img for img in all_originals if not img.startswith('d5/3b/01')]
                 if real_images:
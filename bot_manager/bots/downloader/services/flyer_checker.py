@@ -7,14 +7,16 @@ FlyerService интеграция для монетизации через по
 - Единое правило для ВСЕХ платформ
 """
 
+import asyncio
 import logging
 import os
 from datetime import datetime
-from typing import Optional
+from typing import Dict, Optional
 
-from sqlalchemy import select, func
+from sqlalchemy import bindparam, select, func
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from shared.database import AsyncSessionLocal
 from shared.database.models import User, ActionLog
 
 # Попытка импортировать flyerapi (может быть не установлен)
@@ -35,6 +37,32 @@ FLYER_DISABLED = False  # Глобальный выключатель
 FREE_DAYS = 0          # Без медового месяца - реклама сразу с 1 дня
 CHECK_INTERVAL = 10    # Проверять каждое N-е скачивание
 
+# Кастомное сообщение для SaveNinja (текст и кнопки одинаковы для всех юзеров —
+# собираем один раз, а не на каждую проверку)
+FLYER_CUSTOM_MESSAGE = {
+    'text': '📥 <b>Чтобы скачать видео</b>, подпишись на нашего партнёра\n\n<i>После подписки отправь ссылку ещё раз</i>',
+    'button_bot': '🤖 Запустить',
+    'button_channel': '📢 Подписаться',
+    'button_fp': '✅ Проверить',
+}
+
+# Проверки подписки, которые сейчас в полёте: telegram_id -> Task
+# (пачка ссылок от одного юзера не должна дёргать API и показывать рекламу N раз)
+_inflight_checks: Dict[int, "asyncio.Task[bool]"] = {}
+
+# Статистика юзера одним запросом: только created_at (без гидрации всей строки User)
+# и число успешных скачиваний — count(*) по индексу idx_action_log_user_action
+USER_STATS_STMT = select(
+    User.created_at,
+    select(func.count())
+    .select_from(ActionLog)
+    .where(
+        ActionLog.user_id == User.id,
+        ActionLog.action == "download_success",
+    )
+    .scalar_subquery(),
+).where(User.telegram_id == bindparam("telegram_id"))
+
 # Инициализация клиента
 _flyer: Optional[Flyer] = None
 
@@ -61,29 +89,19 @@ async def get_user_stats(session: AsyncSession, telegram_id: int) -> dict:
             "total_downloads": int,
         }
     """
-    # Получаем юзера
-    user_result = await session.execute(
-        select(User).where(User.telegram_id == telegram_id)
-    )
-    user = user_result.scalar_one_or_none()
+    row = (await session.execute(USER_STATS_STMT, {"telegram_id": telegram_id})).first()
 
-    if not user:
+    if not row:
         return {
             "days_since_registration": 0,
             "total_downloads": 0,
         }
 
+    created_at, total_downloads = row
+
     # Считаем дни с регистрации
-    days_since = (datetime.utcnow() - user.created_at).days if user.created_at else 0
-
-    # Считаем общее количество успешных скачиваний
-    total_result = await session.execute(
-        select(func.count(ActionLog.id)).where(
-            ActionLog.user_id == user.id,
-            ActionLog.action == "download_success"
-        )
-    )
-    total_downloads = total_result.scalar() or 0
+    days_since = (datetime.utcnow() - created_at).days if created_at else 0
+    total_downloads = total_downloads or 0
 
     return {
         "days_since_registration": days_since,
@@ -118,7 +136,7 @@ async def should_check_subscription(
 
     # Step A: Медовый месяц — первые N дней бесплатно
     if days < FREE_DAYS:
-        logger.debug(f"[FLYER] User {telegram_id}: FREE (honey period, day {days + 1}/{FREE_DAYS})")
+        logger.debug("[FLYER] User %s: FREE (honey period, day %s/%s)", telegram_id, days + 1, FREE_DAYS)
         return False
 
     # Step B: Номер текущего скачивания (это будет следующее после total)
@@ -130,7 +148,7 @@ async def should_check_subscription(
         return True
 
     # Step D: Остальные скачивания бесплатны
-    logger.debug(f"[FLYER] User {telegram_id}: FREE (download #{current_download})")
+    logger.debug("[FLYER] User %s: FREE (download #%s)", telegram_id, current_download)
     return False
 
 
@@ -144,6 +162,9 @@ async def check_subscription(
     Если пользователь не подписан — FlyerAPI автоматически покажет ему
     сообщение с кнопками для подписки.
 
+    Одновременные проверки одного юзера склеиваются: второй вызов ждёт
+    результат первого, а не делает свой запрос.
+
     Args:
         telegram_id: Telegram user ID
         language_code: Язык пользователя
@@ -151,6 +172,20 @@ async def check_subscription(
     Returns:
         True если подписан (можно скачивать), False если нет (сообщение уже показано)
     """
+    task = _inflight_checks.get(telegram_id)
+    if task is None:
+        task = asyncio.create_task(_check_subscription(telegram_id, language_code))
+        _inflight_checks[telegram_id] = task
+        task.add_done_callback(lambda _: _inflight_checks.pop(telegram_id, None))
+    else:
+        logger.info(f"[FLYER] User {telegram_id}: check already in flight, waiting")
+
+    # shield: отмена одного ожидающего не должна отменять общую проверку
+    return await asyncio.shield(task)
+
+
+async def _check_subscription(telegram_id: int, language_code: str) -> bool:
+    """Реальный запрос к FlyerService (см. check_subscription)."""
     try:
         flyer = get_flyer()
         if flyer is None:
@@ -163,16 +198,8 @@ async def check_subscription(
             del flyer._cache[telegram_id]
             logger.debug(f"[FLYER] User {telegram_id}: cleared local cache")
 
-        # Кастомное сообщение для SaveNinja
-        custom_message = {
-            'text': '📥 <b>Чтобы скачать видео</b>, подпишись на нашего партнёра\n\n<i>После подписки отправь ссылку ещё раз</i>',
-            'button_bot': '🤖 Запустить',
-            'button_channel': '📢 Подписаться',
-            'button_fp': '✅ Проверить',
-        }
-
         logger.info(f"[FLYER] User {telegram_id}: calling API check()...")
-        result = await flyer.check(telegram_id, language_code=language_code, message=custom_message)
+        result = await flyer.check(telegram_id, language_code=language_code, message=FLYER_CUSTOM_MESSAGE)
 
         if result:
             # Юзер подписан — тихий проход
@@ -202,7 +229,6 @@ class FlyerCheckResult:
 
 
 async def check_and_allow(
-    session: AsyncSession,
     telegram_id: int,
     platform: str,
     language_code: str = "ru",
@@ -210,8 +236,11 @@ async def check_and_allow(
     """
     Главная функция: проверить нужна ли подписка и если да — проверить её.
 
+    Сессию БД открывает сама и только когда она реально нужна: при выключенном
+    Flyer запрос обходится без checkout соединения из пула, а на время
+    HTTP-запроса к FlyerAPI соединение уже возвращено.
+
     Args:
-        session: SQLAlchemy async session
         telegram_id: Telegram user ID
         platform: Платформа скачивания (для совместимости, не влияет на логику)
         language_code: Язык пользователя
@@ -221,12 +250,13 @@ async def check_and_allow(
     """
     # Глобальный выключатель
     if FLYER_DISABLED:
-        logger.debug(f"[FLYER] Disabled, allowing download for {telegram_id}")
+        logger.debug("[FLYER] Disabled, allowing download for %s", telegram_id)
         return FlyerCheckResult(allowed=True, flyer_required=False)
 
     try:
         # Проверяем нужна ли проверка для этого случая
-        should_check = await should_check_subscription(session, telegram_id, platform)
+        async with AsyncSessionLocal() as session:
+            should_check = await should_check_subscription(session, telegram_id, platform)
 
         if not should_check:
             # Бесплатное скачивание (медовый месяц или не 10-е)
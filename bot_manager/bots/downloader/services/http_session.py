@@ -0,0 +1,57 @@
+"""
+Общая aiohttp сессия для исходящих HTTP запросов загрузчиков
+
+Раньше каждый запрос (резолв коротких ссылок, RapidAPI, SaveNow,
+каждый poll прогресса) создавал свой ClientSession со своим коннектором —
+то есть заново DNS + TCP + TLS на каждый вызов. Одна сессия на процесс
+держит keep-alive соединения и кэширует DNS.
+"""
+import logging
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Optional
+
+import aiohttp
+
+logger = logging.getLogger(__name__)
+
+# Лимиты коннектора
+HTTP_CONNECTION_LIMIT = 200       # Всего одновременных соединений
+HTTP_LIMIT_PER_HOST = 64          # На один хост (API провайдера, CDN)
+HTTP_DNS_CACHE_TTL = 300          # секунд
+HTTP_KEEPALIVE_TIMEOUT = 75       # секунд простоя до закрытия соединения
+
+_session: Optional[aiohttp.ClientSession] = None
+
+
+def get_http_session() -> aiohttp.ClientSession:
+    """Получить общую aiohttp сессию (ленивая инициализация)"""
+    global _session
+    if _session is None or _session.closed:
+        connector = aiohttp.TCPConnector(
+            limit=HTTP_CONNECTION_LIMIT,
+            limit_per_host=HTTP_LIMIT_PER_HOST,
+            ttl_dns_cache=HTTP_DNS_CACHE_TTL,
+            keepalive_timeout=HTTP_KEEPALIVE_TIMEOUT,
+            enable_cleanup_closed=True,
+        )
+        _session = aiohttp.ClientSession(connector=connector)
+        logger.info(f"[HTTP] Shared session created (limit={HTTP_CONNECTION_LIMIT}, per_host={HTTP_LIMIT_PER_HOST})")
+    return _session
+
+
+@asynccontextmanager
+async def http_session() -> AsyncIterator[aiohttp.ClientSession]:
+    """
+    Drop-in замена `async with aiohttp.ClientSession() as session:`.
+
+    Отдаёт общую сессию и НЕ закрывает её на выходе из блока.
+    """
+    yield get_http_session()
+
+
+async def close_http_session():
+    """Закрыть общую сессию (при остановке)"""
+    global _session
+    if _session is not None:
+        await _session.close()
+        _session = None
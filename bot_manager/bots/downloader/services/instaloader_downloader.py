@@ -30,6 +30,16 @@ DOWNLOAD_DIR = "/tmp/downloads"
 MAX_FILE_SIZE_BYTES = 2_000_000_000  # 2GB
 DOWNLOAD_TIMEOUT = 600  # 10 минут для Instagram
 
+# Регулярки для извлечения shortcode (компилируем один раз)
+SHORTCODE_PATTERNS = (
+    re.compile(r'instagram\.com/(?:p|reel)/([A-Za-z0-9_-]+)'),
+    re.compile(r'instagr\.am/p/([A-Za-z0-9_-]+)'),
+)
+
+# Расширения метаданных instaloader (.json.xz даёт suffix '.xz')
+METADATA_SUFFIXES = frozenset({'.txt', '.json', '.xz'})
+PHOTO_SUFFIXES = frozenset({'.jpg', '.jpeg', '.png', '.webp'})
+
 _executor = ThreadPoolExecutor(max_workers=2)
 
 
@@ -81,13 +91,8 @@ class InstaloaderDownloader:
         - https://www.instagram.com/reel/ABC123/
         - https://instagram.com/p/ABC123/
         """
-        patterns = [
-            r'instagram\.com/(?:p|reel)/([A-Za-z0-9_-]+)',
-            r'instagr\.am/p/([A-Za-z0-9_-]+)',
-        ]
-
-        for pattern in patterns:
-            match = re.search(pattern, url)
+        for pattern in SHORTCODE_PATTERNS:
+            match = pattern.search(url)
             if match:
                 return match.group(1)
 
@@ -191,8 +196,10 @@ class InstaloaderDownloader:
             # Ищем файлы в папке
             for file_path in Path(temp_dir).iterdir():
                 if file_path.is_file():
+                    suffix = file_path.suffix.lower()
+
                     # Пропускаем txt/json метаданные
-                    if file_path.suffix.lower() in ['.txt', '.json', '.json.xz']:
+                    if suffix in METADATA_SUFFIXES:
                         continue
 
                     file_size = os.path.getsize(file_path)
@@ -205,7 +212,7 @@ class InstaloaderDownloader:
                         continue
 
                     # Определяем тип
-                    is_photo = file_path.suffix.lower() in ['.jpg', '.jpeg', '.png', '.webp']
+                    is_photo = suffix in PHOTO_SUFFIXES
 
                     # Перемещаем в основную папку
                     new_filename = f"{shortcode}_{len(files)}{file_path.suffix}"
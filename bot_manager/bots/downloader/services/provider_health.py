@@ -13,13 +13,21 @@ Provider Health Check Service
 import asyncio
 import logging
 import os
+import threading
 from typing import Tuple
 from concurrent.futures import ThreadPoolExecutor
 
+from .http_session import http_session
+
 logger = logging.getLogger(__name__)
 
 _executor = ThreadPoolExecutor(max_workers=3)
 
+# Инстансы YoutubeDL для пинга: по одному на поток пула и на таймаут.
+# YoutubeDL не потокобезопасен, поэтому между потоками не шарим, но внутри
+# потока переиспользуем — init (экстракторы, куки, валидация опций) не бесплатный
+_ytdlp_local = threading.local()
+
 # RapidAPI config
 RAPIDAPI_KEY = os.getenv("RAPIDAPI_KEY", "")
 RAPIDAPI_HOST = os.getenv("RAPIDAPI_HOST", "social-download-all-in-one.p.rapidapi.com")
@@ -64,21 +72,31 @@ async def _ping_ytdlp(url: str, timeout: int) -> Tuple[bool, str]:
     """
     import yt_dlp
 
+    def _get_ydl():
+        instances = getattr(_ytdlp_local, 'instances', None)
+        if instances is None:
+            instances = _ytdlp_local.instances = {}
+
+        ydl = instances.get(timeout)
+        if ydl is None:
+            opts = {
+                'quiet': True,
+                'no_warnings': True,
+                'extract_flat': True,  # Не извлекать вложенные плейлисты
+                'noplaylist': True,  # watch?v=...&list=... — пингуем только сам ролик
+                'socket_timeout': timeout,
+                'skip_download': True,
+            }
+            ydl = instances[timeout] = yt_dlp.YoutubeDL(opts)
+        return ydl
+
     def _extract_sync():
-        opts = {
-            'quiet': True,
-            'no_warnings': True,
-            'extract_flat': True,  # Не извлекать вложенные плейлисты
-            'socket_timeout': timeout,
-            'skip_download': True,
-        }
-        with yt_dlp.YoutubeDL(opts) as ydl:
-            info = ydl.extract_info(url, download=False)
-            if info is None:
-                raise Exception("No info extracted")
-            return info.get('title', 'OK')
-
-    loop = asyncio.get_event_loop()
+        info = _get_ydl().extract_info(url, download=False)
+        if info is None:
+            raise Exception("No info extracted")
+        return info.get('title', 'OK')
+
+    loop = asyncio.get_running_loop()
     try:
         result = await asyncio.wait_for(
             loop.run_in_executor(_executor, _extract_sync),
@@ -113,7 +131,7 @@ async def _ping_pytubefix(url: str, timeout: int) -> Tuple[bool, str]:
             raise Exception("No streams available")
         return title
 
-    loop = asyncio.get_event_loop()
+    loop = asyncio.get_running_loop()
     try:
         result = await asyncio.wait_for(
             loop.run_in_executor(_executor, _check_sync),
@@ -148,7 +166,7 @@ async def _ping_rapidapi(url: str, timeout: int) -> Tuple[bool, str]:
     }
 
     try:
-        async with aiohttp.ClientSession() as session:
+        async with http_session() as session:
             async with session.post(
                 api_url,
                 json={"url": url},
@@ -183,7 +201,7 @@ async def _ping_savenow(url: str, timeout: int) -> Tuple[bool, str]:
     api_url = "https://api.savenow.co/v1/download"
 
     try:
-        async with aiohttp.ClientSession() as session:
+        async with http_session() as session:
             async with session.post(
                 api_url,
                 json={"url": url},
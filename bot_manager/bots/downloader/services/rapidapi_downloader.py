@@ -25,6 +25,8 @@ from curl_cffi import requests as curl_requests
 
 from shared.utils.video_fixer import fix_video, ensure_faststart
 
+from .http_session import http_session
+
 logger = logging.getLogger(__name__)
 
 # Константы
@@ -278,7 +280,7 @@ class RapidAPIDownloader:
         }
 
         try:
-            async with aiohttp.ClientSession() as session:
+            async with http_session() as session:
                 async with session.post(
                     RAPIDAPI_URL,
                     json={"url": url},
@@ -556,10 +558,11 @@ class RapidAPIDownloader:
     ) -> DownloadedFile:
         """Синхронное скачивание файла"""
         try:
-            # Логируем hostname для диагностики (googlevideo = YouTube CDN, другое = прокси)
-            from urllib.parse import urlparse
-            parsed = urlparse(media_url)
-            logger.info(f"[RAPIDAPI] Download host: {parsed.netloc}, path_start: {parsed.path[:50]}")
+            # Логируем hostname для диагностики (googlevideo = YouTube CDN, другое = прокси).
+            # У CDN-ссылок длинный подписанный query — отрезаем partition'ом, без urlparse
+            _, _, host_path = media_url.partition('?')[0].partition('://')
+            host, _, path = host_path.partition('/')
+            logger.info(f"[RAPIDAPI] Download host: {host}, path_start: {('/' + path)[:50]}")
 
             # Скачиваем с потоковой передачей (для больших файлов)
             response = curl_requests.get(
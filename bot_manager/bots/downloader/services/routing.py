@@ -6,12 +6,19 @@ Dynamic Routing Service
 """
 import json
 import logging
-from typing import List, Optional
-from dataclasses import dataclass
+from typing import Dict, List, Optional
+from dataclasses import dataclass, field
 from datetime import datetime
 
 from .cache import get_redis
 
+# orjson быстрее stdlib json (C-парсер без промежуточных str) — если установлен
+try:
+    import orjson
+    _json_loads = orjson.loads
+except ImportError:
+    _json_loads = json.loads
+
 logger = logging.getLogger(__name__)
 
 # Дефолтные chains (fallback если Redis недоступен или нет конфига)
@@ -43,6 +50,13 @@ class RoutingChain:
     providers: List[ProviderConfig]
     is_override: bool = False
     override_expires_at: Optional[datetime] = None
+    # Индекс name -> ProviderConfig (первое вхождение, как при линейном поиске)
+    _by_name: Dict[str, ProviderConfig] = field(init=False, repr=False, compare=False)
+
+    def __post_init__(self):
+        self._by_name = {}
+        for p in self.providers:
+            self._by_name.setdefault(p.name, p)
 
     def get_enabled_providers(self) -> List[str]:
         """Получить список включённых провайдеров в порядке приоритета"""
@@ -50,17 +64,13 @@ class RoutingChain:
 
     def get_timeout(self, provider_name: str) -> int:
         """Получить download timeout для провайдера"""
-        for p in self.providers:
-            if p.name == provider_name:
-                return p.timeout_sec
-        return 60  # default
+        p = self._by_name.get(provider_name)
+        return p.timeout_sec if p else 60  # default
 
     def get_connect_timeout(self, provider_name: str) -> int:
         """Получить connection/ping timeout для провайдера"""
-        for p in self.providers:
-            if p.name == provider_name:
-                return p.connect_sec
-        return 5  # default
+        p = self._by_name.get(provider_name)
+        return p.connect_sec if p else 5  # default
 
 
 async def get_routing_chain(source: str) -> RoutingChain:
@@ -79,10 +89,14 @@ async def get_routing_chain(source: str) -> RoutingChain:
     try:
         redis = await get_redis()
 
+        # Override и сохранённый config одним MGET (один round-trip вместо двух)
+        override_json, chain_json = await redis.mget(
+            f"routing_override:{source}", f"routing:{source}"
+        )
+
         # Сначала проверяем override
-        override_json = await redis.get(f"routing_override:{source}")
         if override_json:
-            override_data = json.loads(override_json)
+            override_data = _json_loads(override_json)
             expires_at = datetime.fromisoformat(override_data["expires_at"])
             if expires_at > datetime.utcnow():
                 logger.info(f"[ROUTING] Using override for {source}: {override_data['chain']}")
@@ -93,10 +107,9 @@ async def get_routing_chain(source: str) -> RoutingChain:
                     override_expires_at=expires_at
                 )
 
-        # Читаем сохранённый config
-        chain_json = await redis.get(f"routing:{source}")
+        # Сохранённый config
         if chain_json:
-            chain_data = json.loads(chain_json)
+            chain_data = _json_loads(chain_json)
             providers = []
             for p in chain_data:
                 if isinstance(p, dict):
@@ -109,7 +122,8 @@ async def get_routing_chain(source: str) -> RoutingChain:
                 else:
                     providers.append(ProviderConfig(name=p))
 
-            logger.debug(f"[ROUTING] Using saved config for {source}: {[p.name for p in providers]}")
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("[ROUTING] Using saved config for %s: %s", source, [p.name for p in providers])
             return RoutingChain(source=source, providers=providers)
 
     except Exception as e:
@@ -117,7 +131,7 @@ async def get_routing_chain(source: str) -> RoutingChain:
 
     # Fallback на дефолт
     default_chain = DEFAULT_CHAINS.get(source, ["ytdlp"])
-    logger.debug(f"[ROUTING] Using default for {source}: {default_chain}")
+    logger.debug("[ROUTING] Using default for %s: %s", source, default_chain)
     return RoutingChain(
         source=source,
         providers=[ProviderConfig(name=p) for p in default_chain]
@@ -15,11 +15,13 @@ Flow:
 4. Скачиваем файл
 """
 import os
+import re
 import asyncio
 import logging
 import time
 import uuid
 from dataclasses import dataclass
+from functools import lru_cache
 from typing import Optional
 from concurrent.futures import ThreadPoolExecutor
 from urllib.parse import urlparse
@@ -31,10 +33,11 @@ from shared.utils.video_fixer import (
     fix_video,
     ensure_faststart,
     download_thumbnail,
-    get_video_dimensions,
-    get_video_duration
+    probe_video
 )
 
+from .http_session import http_session
+
 logger = logging.getLogger(__name__)
 
 # Константы
@@ -47,6 +50,22 @@ DOWNLOAD_TIMEOUT = 1200  # 20 минут для больших видео
 POLL_INTERVAL = 5  # Секунд между проверками progress
 MAX_POLL_TIME = 600  # 10 минут максимум на подготовку
 
+# Извлечение video_id из YouTube URL (компилируем один раз)
+YOUTUBE_VIDEO_ID_PATTERNS = (
+    re.compile(r'(?:youtube\.com/watch\?v=|youtu\.be/|youtube\.com/shorts/)([a-zA-Z0-9_-]{11})'),
+    re.compile(r'youtube\.com/embed/([a-zA-Z0-9_-]{11})'),
+)
+
+
+@lru_cache(maxsize=512)
+def extract_youtube_video_id(url: str) -> Optional[str]:
+    """video_id из YouTube URL (мемоизировано: одни и те же ссылки приходят повторно)"""
+    for pattern in YOUTUBE_VIDEO_ID_PATTERNS:
+        match = pattern.search(url)
+        if match:
+            return match.group(1)
+    return None
+
 _executor = ThreadPoolExecutor(max_workers=3)
 
 
@@ -139,20 +158,7 @@ class SaveNowDownloader:
         - mqdefault.jpg (320x180)
         - default.jpg (120x90)
         """
-        import re
-
-        # Извлекаем video_id из URL
-        patterns = [
-            r'(?:youtube\.com/watch\?v=|youtu\.be/|youtube\.com/shorts/)([a-zA-Z0-9_-]{11})',
-            r'youtube\.com/embed/([a-zA-Z0-9_-]{11})',
-        ]
-
-        video_id = None
-        for pattern in patterns:
-            match = re.search(pattern, url)
-            if match:
-                video_id = match.group(1)
-                break
+        video_id = extract_youtube_video_id(url)
 
         if not video_id:
             logger.warning(f"[SAVENOW] Could not extract video_id from URL: {url}")
@@ -366,7 +372,7 @@ class SaveNowDownloader:
                 "allow_extended_duration": "1"  # Разрешаем длинные видео
             }
 
-            async with aiohttp.ClientSession() as session:
+            async with http_session() as session:
                 async with session.get(
                     endpoint,
                     params=params,
@@ -456,18 +462,19 @@ class SaveNowDownloader:
         if not progress_url:
             progress_url = f"{RAPIDAPI_BASE_URL}/ajax/progress.php?id={job_id}"
 
-        start_time = asyncio.get_event_loop().time()
+        loop = asyncio.get_running_loop()
+        start_time = loop.time()
         last_progress = 0
 
         while True:
-            elapsed = asyncio.get_event_loop().time() - start_time
+            elapsed = loop.time() - start_time
 
             if elapsed > MAX_POLL_TIME:
                 logger.warning(f"[SAVENOW] Poll timeout after {elapsed:.0f}s")
                 return None
 
             try:
-                async with aiohttp.ClientSession() as session:
+                async with http_session() as session:
                     async with session.get(
                         progress_url,
                         headers=self._get_headers(),
@@ -565,9 +572,8 @@ class SaveNowDownloader:
             # Гарантируем faststart (moov в начале)
             ensure_faststart(file_path)
 
-            # Получаем реальные размеры и duration после фикса
-            width, height = get_video_dimensions(file_path)
-            duration = get_video_duration(file_path)
+            # Получаем реальные размеры и duration после фикса (один ffprobe)
+            width, height, duration = probe_video(file_path)
 
             # Скачиваем thumbnail
             thumb_path = None
@@ -616,7 +622,7 @@ class SaveNowDownloader:
                 "u": url
             }
 
-            async with aiohttp.ClientSession() as session:
+            async with http_session() as session:
                 async with session.get(
                     endpoint,
                     params=params,
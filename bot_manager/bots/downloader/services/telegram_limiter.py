@@ -0,0 +1,62 @@
+"""
+Глобальный лимитер отправок в Telegram
+
+Telegram ограничивает бота ~30 сообщениями в секунду на все чаты. Лимит на
+юзера (acquire_user_slot) от этого не спасает: при наплыве на вирусную ссылку
+параллельные отправки упираются в 429 и flood control на весь бот.
+
+- Отправки распределяются равномерно: не чаще TG_SENDS_PER_SECOND в секунду
+  (альбом из N файлов считается как N сообщений)
+- Одновременных загрузок не больше TG_MAX_CONCURRENT_SENDS
+- Получили TelegramRetryAfter — pause(retry_after) придерживает ВСЕ
+  следующие отправки, а не только ту, что словила 429
+"""
+import asyncio
+import logging
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator
+
+logger = logging.getLogger(__name__)
+
+TG_SENDS_PER_SECOND = 30
+TG_MAX_CONCURRENT_SENDS = 30
+
+
+class TelegramSendLimiter:
+    """Равномерный rate limit + ограничение одновременных отправок + общая пауза"""
+
+    def __init__(self, rate: float, max_concurrent: int):
+        self._interval = 1.0 / rate
+        self._semaphore = asyncio.Semaphore(max_concurrent)
+        self._next_slot = 0.0   # monotonic: когда можно начать следующую отправку
+        self._resume_at = 0.0   # monotonic: до какого момента действует flood control
+
+    @asynccontextmanager
+    async def limit(self, cost: int = 1) -> AsyncIterator[None]:
+        """
+        Обернуть одну отправку.
+
+        Args:
+            cost: сколько сообщений она стоит (для альбома — число файлов)
+        """
+        async with self._semaphore:
+            # Резервируем слот синхронно (до await), поэтому параллельные
+            # отправки получают разные слоты без блокировок
+            now = time.monotonic()
+            start = max(now, self._next_slot, self._resume_at)
+            self._next_slot = start + self._interval * cost
+            if start > now:
+                await asyncio.sleep(start - now)
+            yield
+
+    def pause(self, seconds: float) -> None:
+        """Flood control от Telegram: придержать все отправки на seconds"""
+        resume_at = time.monotonic() + seconds
+        if resume_at > self._resume_at:
+            self._resume_at = resume_at
+            logger.warning(f"[TG_LIMITER] Flood control: all sends paused for {seconds}s")
+
+
+# Один на процесс (лимит Telegram — на бота, а не на хендлер)
+tg_limiter = TelegramSendLimiter(TG_SENDS_PER_SECOND, TG_MAX_CONCURRENT_SENDS)
@@ -12,18 +12,11 @@ from datetime import datetime
 from aiogram import Bot
 from aiogram.client.default import DefaultBotProperties
 from aiogram.enums import ParseMode
-from sqlalchemy import select, update
 
 from shared.database import init_db
 from shared.database.connection import async_session
 from shared.config import settings
 
-# Импортируем модели из admin_panel для работы с broadcasts
-# Но они одинаковые с shared, так что просто создадим локальную копию
-from sqlalchemy import Column, Integer, String, Text, DateTime, Enum as SQLEnum, JSON
-from sqlalchemy.orm import declarative_base
-import enum
-
 from bot_manager.services.broadcast_worker import BroadcastWorker
 
 logging.basicConfig(
@@ -36,14 +29,6 @@ logger = logging.getLogger(__name__)
 CHECK_INTERVAL = 10
 
 
-class BroadcastStatus(str, enum.Enum):
-    DRAFT = "draft"
-    SCHEDULED = "scheduled"
-    RUNNING = "running"
-    COMPLETED = "completed"
-    CANCELLED = "cancelled"
-
-
 async def process_broadcast(bot: Bot, broadcast_id: int):
     """Обработать одну рассылку."""
     async with async_session() as session:
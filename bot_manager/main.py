@@ -1,20 +1,47 @@
 import asyncio
 import logging
 import os
+import queue
+from logging.handlers import QueueHandler, QueueListener
 from aiogram import Bot, Dispatcher
 from aiogram.enums import ParseMode
 from aiogram.client.default import DefaultBotProperties
 from aiogram.client.session.aiohttp import AiohttpSession
 from aiogram.client.telegram import TelegramAPIServer
 
-from shared.database import init_db, AsyncSessionLocal
+# orjson (если установлен): (де)сериализация апдейтов и запросов к Bot API
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# uvloop (если установлен): event loop на libuv вместо стандартного selector loop
+try:
+    import uvloop
+except ImportError:
+    uvloop = None
+
+from shared.database import init_db, warmup_pool, AsyncSessionLocal
 from shared.config import settings
 
 # Import bot routers
 from bot_manager.bots.downloader import router as downloader_router
 
 # Import middlewares
-from bot_manager.middlewares import UserTrackingMiddleware, init_bot_record
+from bot_manager.middlewares import (
+    UserTrackingMiddleware,
+    init_bot_record,
+    start_action_log_task,
+    stop_action_log_task,
+    start_last_active_task,
+    stop_last_active_task,
+)
+
+# Import Redis client (кэш file_id, лимиты, routing)
+from bot_manager.bots.downloader.services.cache import get_redis
+
+# Import shared HTTP session (исходящие запросы загрузчиков)
+from bot_manager.bots.downloader.services.http_session import close_http_session
 
 # Import messages loader
 from bot_manager.bots.downloader.messages import load_messages_from_db, start_cache_refresh_task
@@ -22,10 +49,24 @@ from bot_manager.bots.downloader.messages import load_messages_from_db, start_ca
 # Import system metrics collector
 from bot_manager.services.system_metrics import start_system_metrics_task
 
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
-)
+# Import tmp cleanup (осиротевшие файлы скачивания)
+from bot_manager.services.tmp_cleanup import start_tmp_cleanup_task
+
+# Логи пишутся в stderr из отдельного потока: в event loop только put в очередь,
+# форматирование и write()/flush() — в потоке QueueListener
+# Уровень из settings (LOG_LEVEL), резолвится один раз; неизвестное значение -> INFO
+LOG_LEVEL = getattr(logging, settings.log_level.upper(), logging.INFO)
+LOG_FORMATTER = logging.Formatter("%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+
+_log_stream_handler = logging.StreamHandler()
+_log_stream_handler.setFormatter(LOG_FORMATTER)
+_log_queue: "queue.SimpleQueue[logging.LogRecord]" = queue.SimpleQueue()
+logging.basicConfig(level=LOG_LEVEL, handlers=[QueueHandler(_log_queue)])
+_log_listener = QueueListener(_log_queue, _log_stream_handler, respect_handler_level=True)
+# Формат не использует thread/process — не собираем их в каждую LogRecord
+logging.logThreads = False
+logging.logProcesses = False
+logging.logMultiprocessing = False
 logger = logging.getLogger(__name__)
 
 # Local Bot API Server URL (для файлов до 2GB)
@@ -38,9 +79,16 @@ async def start_bot(token: str, name: str, router):
 
     # Настраиваем сессию для использования Local Bot API Server
     # Таймаут 45 минут для загрузки файлов до 2GB через Local Bot API
+    json_kwargs = {}
+    if orjson is not None:
+        json_kwargs = {
+            "json_loads": orjson.loads,
+            "json_dumps": lambda obj: orjson.dumps(obj).decode(),
+        }
     session = AiohttpSession(
         api=TelegramAPIServer.from_base(LOCAL_BOT_API_SERVER),
-        timeout=2700.0  # 45 минут для больших файлов
+        timeout=2700.0,  # 45 минут для больших файлов
+        **json_kwargs,
     )
 
     logger.info(f"Using Local Bot API Server: {LOCAL_BOT_API_SERVER} (2GB file limit)")
@@ -53,8 +101,10 @@ async def start_bot(token: str, name: str, router):
     dp = Dispatcher()
 
     # Регистрируем middleware для трекинга пользователей
-    dp.message.middleware(UserTrackingMiddleware())
-    dp.callback_query.middleware(UserTrackingMiddleware())
+    # (один инстанс, только на те типы апдейтов, которые он умеет обрабатывать)
+    tracking_middleware = UserTrackingMiddleware()
+    for update_type in UserTrackingMiddleware.UPDATE_TYPES:
+        dp.observers[update_type].middleware(tracking_middleware)
 
     dp.include_router(router)
 
@@ -68,21 +118,47 @@ async def start_bot(token: str, name: str, router):
 
     logger.info(f"Starting bot: {name} (@{bot_info.username})")
 
+    # Telegram присылает только апдейты, на которые есть хендлеры —
+    # остальные типы не доходят ни до middleware, ни до парсинга
+    allowed_updates = dp.resolve_used_update_types()
+    logger.info(f"Allowed updates for {name}: {allowed_updates}")
+
     try:
-        await dp.start_polling(bot, allowed_updates=dp.resolve_used_update_types())
+        await dp.start_polling(bot, allowed_updates=allowed_updates)
     except Exception as e:
         logger.error(f"Bot {name} error: {e}")
         raise
 
 
+async def _load_messages():
+    """Загружает сообщения бота из БД в кэш."""
+    async with AsyncSessionLocal() as session:
+        await load_messages_from_db(session)
+
+
+async def _warmup_redis():
+    """Открывает соединение с Redis заранее (без Redis бот работает, поэтому не падаем)."""
+    try:
+        redis_client = await get_redis()
+        await redis_client.ping()
+        logger.info("Redis connection ready")
+    except Exception as e:
+        logger.warning(f"Redis warmup failed: {e}")
+
+
 async def main():
+    # Задачи стартуют eagerly: корутина выполняется синхронно до первого await,
+    # без лишнего прохода через очередь loop (в т.ч. таски aiogram на каждый апдейт)
+    asyncio.get_running_loop().set_task_factory(asyncio.eager_task_factory)
+
+    # Независимые шаги старта идут параллельно: схема БД + соединение с Redis,
+    # затем (когда таблицы точно есть) прогрев пула + загрузка сообщений
     logger.info("Initializing database...")
-    await init_db()
+    await asyncio.gather(init_db(), _warmup_redis())
 
-    # Загружаем сообщения бота из БД
     logger.info("Loading bot messages from database...")
-    async with AsyncSessionLocal() as session:
-        await load_messages_from_db(session)
+    opened, _ = await asyncio.gather(warmup_pool(), _load_messages())
+    logger.info(f"Database pool warmed up: {opened} connections")
 
     # Запускаем фоновое обновление кэша сообщений
     start_cache_refresh_task()
@@ -90,6 +166,15 @@ async def main():
     # Запускаем сбор системных метрик для Ops Dashboard
     start_system_metrics_task()
 
+    # Запускаем батчевую запись action_logs
+    start_action_log_task()
+
+    # Запускаем write-behind запись last_active_at
+    start_last_active_task()
+
+    # Запускаем очистку осиротевших файлов в /tmp/downloads
+    start_tmp_cleanup_task()
+
     # Collect all bots to start
     bots_to_start = []
 
@@ -97,7 +182,7 @@ async def main():
     downloader_token = os.getenv("DOWNLOADER_BOT_TOKEN")
     if downloader_token and downloader_token != "YOUR_BOT_TOKEN_HERE":
         bots_to_start.append(
-            start_bot(downloader_token, "SaveNinja", downloader_router)
+            ("SaveNinja", start_bot(downloader_token, "SaveNinja", downloader_router))
         )
         logger.info("Downloader bot configured")
     else:
@@ -108,10 +193,25 @@ async def main():
         return
 
     logger.info(f"Starting {len(bots_to_start)} bot(s)...")
-    await asyncio.gather(*bots_to_start)
+    try:
+        # TaskGroup: падение одного бота отменяет остальных, а не оставляет их висеть
+        async with asyncio.TaskGroup() as tg:
+            for name, bot_coro in bots_to_start:
+                tg.create_task(bot_coro, name=name)
+    finally:
+        # Дописываем накопившиеся action_logs и last_active_at перед выходом
+        await stop_action_log_task()
+        await stop_last_active_task()
+        await close_http_session()
 
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    _log_listener.start()
+    try:
+        with asyncio.Runner(loop_factory=uvloop.new_event_loop if uvloop else None) as runner:
+            runner.run(main())
+    finally:
+        # Дописываем всё, что осталось в очереди логов
+        _log_listener.stop()
 # Test bot deploy
 # Sync 2026-01-18
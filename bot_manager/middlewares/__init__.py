@@ -1,4 +1,12 @@
-from .user_tracking import UserTrackingMiddleware
-from .action_logger import log_action, init_bot_record
+from .user_tracking import UserTrackingMiddleware, start_last_active_task, stop_last_active_task
+from .action_logger import log_action, init_bot_record, start_action_log_task, stop_action_log_task
 
-__all__ = ["UserTrackingMiddleware", "log_action", "init_bot_record"]
+__all__ = [
+    "UserTrackingMiddleware",
+    "start_last_active_task",
+    "stop_last_active_task",
+    "log_action",
+    "init_bot_record",
+    "start_action_log_task",
+    "stop_action_log_task",
+]
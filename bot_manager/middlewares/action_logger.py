@@ -1,19 +1,39 @@
 """
 Утилита для логирования действий пользователей в БД
+
+log_action не пишет в БД сам — кладёт запись в очередь, фоновая задача
+сбрасывает её пачками (один SELECT по telegram_id + один multi-row INSERT).
 """
+import asyncio
 import logging
-from typing import Optional
+from typing import Optional, List
 from datetime import datetime
 
-from shared.database.connection import async_session
+from shared.database.connection import async_session, engine
 from shared.database.models import ActionLog, User, Bot
-from sqlalchemy import select
+from sqlalchemy import BigInteger, any_, bindparam, func, select, insert
+from sqlalchemy.dialects.postgresql import ARRAY, insert as pg_insert
 
 logger = logging.getLogger(__name__)
 
 # ID бота SaveNinja (будет заполнен при старте)
 _bot_id: Optional[int] = None
 
+# Батчинг action_logs
+ACTION_QUEUE_MAXSIZE = 10_000
+ACTION_BATCH_SIZE = 100
+ACTION_FLUSH_INTERVAL = 0.5  # секунд
+
+_action_queue: "asyncio.Queue[dict]" = asyncio.Queue(maxsize=ACTION_QUEUE_MAXSIZE)
+_flush_task: Optional[asyncio.Task] = None
+
+# Резолв telegram_id -> users.id для пачки. Собирается один раз при импорте:
+# telegram_id = ANY(массив) вместо IN (...) — текст SQL не зависит от размера
+# пачки, поэтому и кэш компиляции, и prepared statement asyncpg переиспользуются
+USER_IDS_STMT = select(User.telegram_id, User.id).where(
+    User.telegram_id == any_(bindparam("tids", type_=ARRAY(BigInteger)))
+)
+
 
 async def init_bot_record(bot_username: str, bot_id: int, bot_name: str) -> int:
     """
@@ -22,30 +42,24 @@ async def init_bot_record(bot_username: str, bot_id: int, bot_name: str) -> int:
     """
     global _bot_id
 
-    async with async_session() as session:
-        result = await session.execute(
-            select(Bot).where(Bot.bot_id == bot_id)
-        )
-        db_bot = result.scalar_one_or_none()
-
-        if db_bot:
-            db_bot.username = bot_username
-            db_bot.name = bot_name
-            await session.commit()
-            _bot_id = db_bot.id
-        else:
-            db_bot = Bot(
-                bot_id=bot_id,
-                username=bot_username,
-                name=bot_name,
-            )
-            session.add(db_bot)
-            await session.commit()
-            await session.refresh(db_bot)
-            _bot_id = db_bot.id
-
-        logger.info(f"Bot registered: {bot_username} (db_id={_bot_id})")
-        return _bot_id
+    # Один INSERT ... ON CONFLICT (bot_id) DO UPDATE ... RETURNING id вместо
+    # SELECT + UPDATE/INSERT + commit + refresh (лишние круги до БД).
+    # onupdate колонки updated_at для ON CONFLICT не срабатывает — ставим явно
+    stmt = pg_insert(Bot).values(bot_id=bot_id, username=bot_username, name=bot_name)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[Bot.bot_id],
+        set_={
+            "username": stmt.excluded.username,
+            "name": stmt.excluded.name,
+            "updated_at": func.now(),
+        },
+    ).returning(Bot.id)
+
+    async with engine.begin() as conn:
+        _bot_id = (await conn.execute(stmt)).scalar_one()
+
+    logger.info(f"Bot registered: {bot_username} (db_id={_bot_id})")
+    return _bot_id
 
 
 async def log_action(
@@ -58,7 +72,7 @@ async def log_action(
     api_source: Optional[str] = None,
 ) -> None:
     """
-    Записывает действие пользователя в action_logs.
+    Ставит действие пользователя в очередь на запись в action_logs.
 
     Args:
         telegram_id: Telegram ID пользователя
@@ -69,32 +83,98 @@ async def log_action(
         download_speed_kbps: Скорость скачивания в KB/s
         api_source: Источник API ('rapidapi', 'ytdlp', 'cobalt')
     """
+    if _flush_task is None or _flush_task.done():
+        start_action_log_task()
+
+    try:
+        _action_queue.put_nowait({
+            "telegram_id": telegram_id,
+            "bot_id": _bot_id,
+            "action": action,
+            "details": details,
+            "download_time_ms": download_time_ms,
+            "file_size_bytes": file_size_bytes,
+            "download_speed_kbps": download_speed_kbps,
+            "api_source": api_source,
+        })
+    except asyncio.QueueFull:
+        logger.warning(f"Action log queue full, dropped: user={telegram_id}, action={action}")
+
+
+async def _write_batch(batch: List[dict]) -> None:
+    """Пишет пачку действий: резолв user_id одним запросом + bulk INSERT"""
     try:
         async with async_session() as session:
-            # Находим user_id по telegram_id
-            result = await session.execute(
-                select(User.id).where(User.telegram_id == telegram_id)
-            )
-            user_id = result.scalar_one_or_none()
-
-            if not user_id:
-                logger.warning(f"User not found for action log: {telegram_id}")
-                return
-
-            log_entry = ActionLog(
-                user_id=user_id,
-                bot_id=_bot_id,
-                action=action,
-                details=details,
-                download_time_ms=download_time_ms,
-                file_size_bytes=file_size_bytes,
-                download_speed_kbps=download_speed_kbps,
-                api_source=api_source,
-            )
-            session.add(log_entry)
-            await session.commit()
-
-            logger.debug(f"Action logged: user={telegram_id}, action={action}, api_source={api_source}")
+            telegram_ids = {entry["telegram_id"] for entry in batch}
+            result = await session.execute(USER_IDS_STMT, {"tids": list(telegram_ids)})
+            user_ids = dict(result.all())
+
+            rows = []
+            for entry in batch:
+                user_id = user_ids.get(entry["telegram_id"])
+                if not user_id:
+                    logger.warning(f"User not found for action log: {entry['telegram_id']}")
+                    continue
+                row = dict(entry)
+                del row["telegram_id"]
+                row["user_id"] = user_id
+                rows.append(row)
+
+            if rows:
+                await session.execute(insert(ActionLog), rows)
+                await session.commit()
+
+            logger.debug("Action logs flushed: %s", len(rows))
 
     except Exception as e:
         logger.error(f"Action log error: {e}")
+
+
+def _drain_queue(limit: int) -> List[dict]:
+    """Забирает из очереди до limit записей без ожидания"""
+    batch = []
+    while len(batch) < limit:
+        try:
+            batch.append(_action_queue.get_nowait())
+        except asyncio.QueueEmpty:
+            break
+    return batch
+
+
+async def _flush_loop():
+    """Фоновая задача: сбрасывает очередь раз в ACTION_FLUSH_INTERVAL или по ACTION_BATCH_SIZE"""
+    while True:
+        first = await _action_queue.get()
+        try:
+            if _action_queue.qsize() < ACTION_BATCH_SIZE - 1:
+                await asyncio.sleep(ACTION_FLUSH_INTERVAL)
+        except asyncio.CancelledError:
+            # Остановка — возвращаем запись, её допишет stop_action_log_task
+            _action_queue.put_nowait(first)
+            raise
+        batch = [first] + _drain_queue(ACTION_BATCH_SIZE - 1)
+        # shield: отмена задачи не должна терять уже забранную пачку
+        await asyncio.shield(_write_batch(batch))
+
+
+def start_action_log_task():
+    """Запустить фоновую задачу записи action_logs."""
+    global _flush_task
+    if _flush_task is None or _flush_task.done():
+        _flush_task = asyncio.create_task(_flush_loop())
+        logger.info(f"Started action log flusher (batch={ACTION_BATCH_SIZE}, interval={ACTION_FLUSH_INTERVAL}s)")
+
+
+async def stop_action_log_task():
+    """Остановить фоновую задачу и дописать всё, что осталось в очереди."""
+    global _flush_task
+    if _flush_task is not None:
+        _flush_task.cancel()
+        try:
+            await _flush_task
+        except asyncio.CancelledError:
+            pass
+        _flush_task = None
+
+    while not _action_queue.empty():
+        await _write_batch(_drain_queue(ACTION_BATCH_SIZE))
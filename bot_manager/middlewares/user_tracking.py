@@ -3,21 +3,151 @@ Middleware для отслеживания пользователей
 
 Сохраняет пользователей в БД при первом контакте,
 обновляет last_active_at при каждом сообщении.
+
+last_active_at для юзеров с неизменным профилем пишется write-behind:
+middleware только кладёт telegram_id в множество, фоновая задача раз в секунду
+проставляет всем накопившимся одно время одним UPDATE.
 """
+import asyncio
 import logging
-from typing import Callable, Dict, Any, Awaitable
-from datetime import datetime
+import time
+from typing import Callable, Dict, Any, Awaitable, Optional, Set, Tuple
+from datetime import datetime, timezone
 
 from aiogram import BaseMiddleware
 from aiogram.types import Message, CallbackQuery, TelegramObject
-from sqlalchemy import select
+from sqlalchemy import BigInteger, any_, bindparam, func, literal_column, update
+from sqlalchemy.dialects.postgresql import ARRAY, insert as pg_insert
 
-from shared.database.connection import async_session
+from shared.database.connection import engine
 from shared.database.models import User, BotUser
-from bot_manager.middlewares.action_logger import _bot_id
+from bot_manager.middlewares import action_logger
 
 logger = logging.getLogger(__name__)
 
+# Дебаунс трекинга: пока профиль юзера не менялся, в БД ходим не чаще раза в окно
+# (last_active_at с точностью до минуты, вместо UPDATE на каждое сообщение).
+# Изменение username/имени/языка пишется сразу, минуя окно
+RECENT_TRACK_WINDOW = 60.0  # секунд
+RECENT_TRACK_TTL = 300.0  # записи старше — выкидываются при очистке
+RECENT_SWEEP_INTERVAL = 60.0
+
+# Типы событий, у которых берём from_user
+TRACKED_EVENT_TYPES = frozenset({Message, CallbackQuery})
+
+# Колонки users, которые возвращаем в data["db_user"] — без тяжёлых extra_data (JSON)
+# и ban_reason (Text): они не нужны хендлерам, а JSON ещё и парсился бы на каждый upsert
+USER_COLUMNS = (
+    User.id,
+    User.telegram_id,
+    User.username,
+    User.first_name,
+    User.last_name,
+    User.language_code,
+    User.role,
+    User.is_banned,
+    User.is_blocked,
+    User.created_at,
+    User.last_active_at,
+)
+
+# xmax = 0 только у строки, которую этот же запрос вставил (а не обновил)
+INSERTED_FLAG = literal_column("xmax = 0").label("inserted")
+
+# Write-behind last_active_at
+LAST_ACTIVE_FLUSH_INTERVAL = 1.0  # секунд
+
+# Одна команда на всю пачку: telegram_id = ANY(массив) — текст SQL не зависит
+# от размера пачки, prepared statement переиспользуется
+TOUCH_STMT = (
+    update(User)
+    .where(User.telegram_id == any_(bindparam("tids", type_=ARRAY(BigInteger))))
+    .values(last_active_at=bindparam("ts"))
+)
+
+# telegram_id, у которых last_active_at ещё не записан в БД. Время берётся одно
+# на сброс (точность — LAST_ACTIVE_FLUSH_INTERVAL), datetime на апдейт не создаётся
+_pending_touches: Set[int] = set()
+_touch_task: Optional[asyncio.Task] = None
+
+# telegram_id -> (monotonic timestamp последнего трекинга, профиль, db_user)
+_recent_tracks: Dict[int, Tuple[float, Optional[tuple], Optional[Any]]] = {}
+_last_sweep: float = 0.0
+
+
+def _profile_of(tg_user) -> tuple:
+    """Поля профиля, которые мы храним в users (для сравнения с кэшем)"""
+    return (tg_user.username, tg_user.first_name, tg_user.last_name, tg_user.language_code)
+
+
+def _sweep_recent(now: float) -> None:
+    """Удаляет устаревшие записи, чтобы словарь не рос бесконечно"""
+    global _last_sweep
+
+    if now - _last_sweep < RECENT_SWEEP_INTERVAL:
+        return
+    _last_sweep = now
+
+    stale = [tid for tid, (ts, _, _) in _recent_tracks.items() if now - ts > RECENT_TRACK_TTL]
+    for tid in stale:
+        del _recent_tracks[tid]
+
+
+def _queue_touch(telegram_id: int) -> None:
+    """Отложить обновление last_active_at до следующего сброса"""
+    _pending_touches.add(telegram_id)
+    if _touch_task is None or _touch_task.done():
+        start_last_active_task()
+
+
+async def _flush_touches() -> None:
+    """Пишет накопившиеся last_active_at одним UPDATE"""
+    global _pending_touches
+
+    if not _pending_touches:
+        return
+    batch, _pending_touches = _pending_touches, set()
+
+    # Колонки naive (UTC), поэтому tzinfo отрезаем
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+
+    try:
+        async with engine.begin() as conn:
+            await conn.execute(TOUCH_STMT, {"tids": list(batch), "ts": now})
+        logger.debug("last_active_at flushed: %s", len(batch))
+    except Exception as e:
+        logger.error(f"last_active_at flush error: {e}")
+
+
+async def _touch_loop():
+    """Фоновая задача: сбрасывает last_active_at раз в LAST_ACTIVE_FLUSH_INTERVAL"""
+    while True:
+        await asyncio.sleep(LAST_ACTIVE_FLUSH_INTERVAL)
+        # shield: отмена задачи не должна терять уже забранную пачку
+        await asyncio.shield(_flush_touches())
+
+
+def start_last_active_task():
+    """Запустить фоновую задачу записи last_active_at."""
+    global _touch_task
+    if _touch_task is None or _touch_task.done():
+        _touch_task = asyncio.create_task(_touch_loop())
+        logger.info(f"Started last_active_at flusher (interval={LAST_ACTIVE_FLUSH_INTERVAL}s)")
+
+
+async def stop_last_active_task():
+    """Остановить фоновую задачу и дописать оставшиеся метки."""
+    global _touch_task
+    if _touch_task is not None:
+        _touch_task.cancel()
+        try:
+            await _touch_task
+        except asyncio.CancelledError:
+            pass
+        _touch_task = None
+
+    await _flush_touches()
+
 
 class UserTrackingMiddleware(BaseMiddleware):
     """
@@ -28,84 +158,109 @@ class UserTrackingMiddleware(BaseMiddleware):
     - Сохраняет db_user в event data для использования в хендлерах
     """
 
+    # Типы апдейтов, на которые middleware регистрируется (см. main.start_bot)
+    UPDATE_TYPES = ("message", "callback_query")
+
     async def __call__(
         self,
         handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
         event: TelegramObject,
         data: Dict[str, Any]
     ) -> Any:
-        # Извлекаем пользователя из события
-        user = None
+        # Быстрый выход для событий без пользователя (lookup по точному типу)
+        if type(event) not in TRACKED_EVENT_TYPES:
+            return await handler(event, data)
 
-        if isinstance(event, Message) and event.from_user:
-            user = event.from_user
-        elif isinstance(event, CallbackQuery) and event.from_user:
-            user = event.from_user
+        user = event.from_user
 
         if user and not user.is_bot:
-            try:
-                db_user = await self._track_user(user)
-                data["db_user"] = db_user
-            except Exception as e:
-                logger.error(f"User tracking error: {e}")
+            now = time.monotonic()
+            profile = _profile_of(user)
+            recent = _recent_tracks.get(user.id)
 
-        return await handler(event, data)
+            # Профиль не менялся с последней успешной записи (и юзер уже привязан к боту)
+            unchanged = recent is not None and recent[1] == profile and recent[2] is not None
 
-    async def _track_user(self, tg_user) -> User:
-        """Создаёт или обновляет пользователя в БД"""
-        async with async_session() as session:
-            # Ищем пользователя
-            result = await session.execute(
-                select(User).where(User.telegram_id == tg_user.id)
-            )
-            db_user = result.scalar_one_or_none()
-
-            if db_user:
-                # Обновляем last_active_at и данные профиля
-                db_user.last_active_at = datetime.utcnow()
-                db_user.username = tg_user.username
-                db_user.first_name = tg_user.first_name
-                db_user.last_name = tg_user.last_name
-                if tg_user.language_code:
-                    db_user.language_code = tg_user.language_code
-
-                await session.commit()
-                await session.refresh(db_user)
-
-                logger.debug(f"User updated: {tg_user.id} (@{tg_user.username})")
+            if unchanged:
+                # Профиль тот же — БД из middleware не трогаем. Раз в окно
+                # откладываем last_active_at в write-behind буфер
+                if now - recent[0] >= RECENT_TRACK_WINDOW:
+                    _recent_tracks[user.id] = (now, profile, recent[2])
+                    _sweep_recent(now)
+                    _queue_touch(user.id)
+                data["db_user"] = recent[2]
             else:
-                # Создаём нового пользователя
-                db_user = User(
-                    telegram_id=tg_user.id,
-                    username=tg_user.username,
-                    first_name=tg_user.first_name,
-                    last_name=tg_user.last_name,
-                    language_code=tg_user.language_code or "ru",
-                    last_active_at=datetime.utcnow(),
-                )
-                session.add(db_user)
-                await session.commit()
-                await session.refresh(db_user)
+                # Ставим метку до запроса, чтобы параллельные апдейты тоже отсеклись
+                _recent_tracks[user.id] = (now, profile, recent[2] if recent else None)
+                _sweep_recent(now)
+                try:
+                    db_user = await self._track_user(user)
+                    _recent_tracks[user.id] = (now, profile, db_user)
+                    data["db_user"] = db_user
+                except Exception as e:
+                    # Запись не удалась — откатываем метку, следующий апдейт повторит
+                    if recent:
+                        _recent_tracks[user.id] = recent
+                    else:
+                        _recent_tracks.pop(user.id, None)
+                    logger.error(f"User tracking error: {e}")
+
+        return await handler(event, data)
+
+    async def _track_user(self, tg_user):
+        """
+        Создаёт или обновляет пользователя в БД.
+
+        Работает через Core на голом соединении (без ORM-сессии и identity map):
+        один INSERT ... ON CONFLICT (telegram_id) DO UPDATE ... RETURNING и для
+        нового, и для существующего юзера. Возвращает строку users (Row с теми же
+        атрибутами, что и модель User).
+        """
+        # Одна метка времени на весь вызов. Колонки naive (UTC), поэтому tzinfo отрезаем
+        now = datetime.now(timezone.utc).replace(tzinfo=None)
 
+        values = {
+            "username": tg_user.username,
+            "first_name": tg_user.first_name,
+            "last_name": tg_user.last_name,
+            "last_active_at": now,
+        }
+
+        stmt = pg_insert(User).values(
+            telegram_id=tg_user.id,
+            language_code=tg_user.language_code or "ru",
+            **values,
+        )
+        # Обновляем last_active_at и данные профиля (язык — только если Telegram его прислал).
+        # onupdate колонки updated_at для ON CONFLICT не срабатывает — ставим явно
+        update_values = {name: stmt.excluded[name] for name in values}
+        update_values["updated_at"] = func.now()
+        if tg_user.language_code:
+            update_values["language_code"] = stmt.excluded.language_code
+
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[User.telegram_id],
+            set_=update_values,
+        ).returning(*USER_COLUMNS, INSERTED_FLAG)
+
+        async with engine.begin() as conn:
+            db_user = (await conn.execute(stmt)).first()
+
+            if db_user.inserted:
                 logger.info(f"New user: {tg_user.id} (@{tg_user.username})")
+            else:
+                logger.debug("User updated: %s (@%s)", tg_user.id, tg_user.username)
 
-            # Создаём связь user-bot если ещё нет
-            if _bot_id:
-                result = await session.execute(
-                    select(BotUser).where(
-                        BotUser.user_id == db_user.id,
-                        BotUser.bot_id == _bot_id
-                    )
+            # Создаём связь user-bot если ещё нет (уникальный индекс user_id + bot_id)
+            # (_bot_id читаем из модуля в момент вызова — он заполняется при старте бота)
+            bot_id = action_logger._bot_id
+            if bot_id:
+                result = await conn.execute(
+                    pg_insert(BotUser)
+                    .values(user_id=db_user.id, bot_id=bot_id)
+                    .on_conflict_do_nothing(index_elements=[BotUser.user_id, BotUser.bot_id])
                 )
-                bot_user = result.scalar_one_or_none()
-
-                if not bot_user:
-                    bot_user = BotUser(
-                        user_id=db_user.id,
-                        bot_id=_bot_id,
-                    )
-                    session.add(bot_user)
-                    await session.commit()
-                    logger.info(f"User {tg_user.id} linked to bot {_bot_id}")
+                if result.rowcount:
+                    logger.info(f"User {tg_user.id} linked to bot {bot_id}")
 
             return db_user
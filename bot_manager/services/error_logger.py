@@ -2,7 +2,7 @@
 Error logging service for download errors.
 """
 import logging
-from typing import Optional
+from typing import Dict, Optional
 from sqlalchemy import select
 
 from datetime import datetime
@@ -12,6 +12,25 @@ from shared.database.models import DownloadError, User, Bot, ActionLog, APISourc
 
 logger = logging.getLogger(__name__)
 
+# bot_username -> bots.id (запись бота создаётся при старте и не меняется,
+# поэтому резолвим один раз и дальше берём из памяти)
+_bot_id_cache: Dict[str, int] = {}
+
+
+async def _resolve_bot_id(session, bot_username: str) -> Optional[int]:
+    """Получить bots.id по username (с кэшем в памяти)"""
+    bot_id = _bot_id_cache.get(bot_username)
+    if bot_id is not None:
+        return bot_id
+
+    result = await session.execute(
+        select(Bot.id).where(Bot.username == bot_username)
+    )
+    bot_id = result.scalar_one_or_none()
+    if bot_id is not None:
+        _bot_id_cache[bot_username] = bot_id
+    return bot_id
+
 
 class ErrorLogger:
     """Service to log download errors to database."""
@@ -79,14 +98,8 @@ class ErrorLogger:
                 if user_row:
                     user_id = user_row
 
-                # Get bot_id by username
-                bot_id = None
-                result = await session.execute(
-                    select(Bot.id).where(Bot.username == bot_username)
-                )
-                bot_row = result.scalar_one_or_none()
-                if bot_row:
-                    bot_id = bot_row
+                # Get bot_id by username (cached)
+                bot_id = await _resolve_bot_id(session, bot_username)
 
                 error = DownloadError(
                     user_id=user_id,
@@ -147,14 +160,8 @@ class ErrorLogger:
                 if user_row:
                     user_id = user_row
 
-                # Get bot_id by username
-                bot_id = None
-                result = await session.execute(
-                    select(Bot.id).where(Bot.username == bot_username)
-                )
-                bot_row = result.scalar_one_or_none()
-                if bot_row:
-                    bot_id = bot_row
+                # Get bot_id by username (cached)
+                bot_id = await _resolve_bot_id(session, bot_username)
 
                 action_log = ActionLog(
                     user_id=user_id,
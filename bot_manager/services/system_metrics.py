@@ -5,7 +5,6 @@ System Metrics Collector - записывает CPU/RAM/Disk метрики в R
 import asyncio
 import logging
 import os
-import shutil
 
 import psutil
 import redis.asyncio as redis
@@ -20,62 +19,79 @@ UPDATE_INTERVAL = 30
 # TTL для метрик в Redis (секунды) - чуть больше интервала
 METRICS_TTL = 60
 
+# Папка со временными файлами скачивания
+TMP_DOWNLOADS_PATH = '/tmp/downloads'
 
-async def collect_and_write_metrics(redis_client: redis.Redis):
-    """Собирает системные метрики и записывает в Redis."""
+# Метрика -> ключ в Redis (читает Ops Dashboard), собирается один раз
+METRIC_KEYS = tuple(
+    (name, f"system:{name}")
+    for name in (
+        "cpu_percent",
+        "ram_percent", "ram_used_bytes", "ram_total_bytes",
+        "disk_percent", "disk_used_bytes", "disk_total_bytes",
+        "tmp_used_bytes",
+    )
+)
+
+
+def _dir_size(path: str) -> int:
+    """Размер директории через os.scandir (stat из DirEntry, без лишних syscalls)"""
+    total = 0
     try:
-        # CPU (average over 1 second)
-        cpu_percent = psutil.cpu_percent(interval=1)
+        with os.scandir(path) as it:
+            for entry in it:
+                try:
+                    if entry.is_file(follow_symlinks=False):
+                        total += entry.stat(follow_symlinks=False).st_size
+                    elif entry.is_dir(follow_symlinks=False):
+                        total += _dir_size(entry.path)
+                except OSError:
+                    pass  # Файл удалили во время обхода
+    except OSError:
+        pass
+    return total
+
+
+def _collect_metrics_sync() -> dict:
+    """Блокирующий сбор метрик (выполняется в потоке, не в event loop)."""
+    # CPU (average over 1 second)
+    cpu_percent = psutil.cpu_percent(interval=1)
+
+    # RAM
+    ram = psutil.virtual_memory()
+
+    # Disk (root partition)
+    disk = psutil.disk_usage('/')
+
+    return {
+        "cpu_percent": cpu_percent,
+        "ram_used_bytes": ram.used,
+        "ram_total_bytes": ram.total,
+        "ram_percent": ram.percent,
+        "disk_used_bytes": disk.used,
+        "disk_total_bytes": disk.total,
+        "disk_percent": disk.percent,
+        # /tmp directory size
+        "tmp_used_bytes": _dir_size(TMP_DOWNLOADS_PATH),
+    }
 
-        # RAM
-        ram = psutil.virtual_memory()
-        ram_used_bytes = ram.used
-        ram_total_bytes = ram.total
-        ram_percent = ram.percent
 
-        # Disk (root partition)
-        disk = psutil.disk_usage('/')
-        disk_used_bytes = disk.used
-        disk_total_bytes = disk.total
-        disk_percent = disk.percent
+async def collect_and_write_metrics(redis_client: redis.Redis):
+    """Собирает системные метрики и записывает в Redis."""
+    try:
+        # cpu_percent(interval=1) и обход /tmp/downloads блокируют — уносим в поток
+        metrics = await asyncio.to_thread(_collect_metrics_sync)
 
-        # /tmp directory size
-        tmp_path = '/tmp/downloads'
-        tmp_used_bytes = 0
-        if os.path.exists(tmp_path):
-            for dirpath, dirnames, filenames in os.walk(tmp_path):
-                for f in filenames:
-                    fp = os.path.join(dirpath, f)
-                    try:
-                        tmp_used_bytes += os.path.getsize(fp)
-                    except (OSError, FileNotFoundError):
-                        pass
-
-        # Write to Redis with TTL
-        pipe = redis_client.pipeline()
-
-        # CPU
-        pipe.set("system:cpu_percent", str(cpu_percent), ex=METRICS_TTL)
-
-        # RAM
-        pipe.set("system:ram_percent", str(ram_percent), ex=METRICS_TTL)
-        pipe.set("system:ram_used_bytes", str(ram_used_bytes), ex=METRICS_TTL)
-        pipe.set("system:ram_total_bytes", str(ram_total_bytes), ex=METRICS_TTL)
-
-        # Disk
-        pipe.set("system:disk_percent", str(disk_percent), ex=METRICS_TTL)
-        pipe.set("system:disk_used_bytes", str(disk_used_bytes), ex=METRICS_TTL)
-        pipe.set("system:disk_total_bytes", str(disk_total_bytes), ex=METRICS_TTL)
-
-        # /tmp
-        pipe.set("system:tmp_used_bytes", str(tmp_used_bytes), ex=METRICS_TTL)
-
-        await pipe.execute()
+        # Write to Redis with TTL (числа redis-py сериализует сам)
+        async with redis_client.pipeline(transaction=False) as pipe:
+            for name, key in METRIC_KEYS:
+                pipe.set(key, metrics[name], ex=METRICS_TTL)
+            await pipe.execute()
 
         logger.debug(
-            f"System metrics written: CPU={cpu_percent}%, "
-            f"RAM={ram_percent}% ({ram_used_bytes/1024/1024/1024:.1f}GB), "
-            f"Disk={disk_percent}%, tmp={tmp_used_bytes/1024/1024:.1f}MB"
+            f"System metrics written: CPU={metrics['cpu_percent']}%, "
+            f"RAM={metrics['ram_percent']}% ({metrics['ram_used_bytes']/1024/1024/1024:.1f}GB), "
+            f"Disk={metrics['disk_percent']}%, tmp={metrics['tmp_used_bytes']/1024/1024:.1f}MB"
         )
 
     except Exception as e:
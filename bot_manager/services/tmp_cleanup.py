@@ -0,0 +1,96 @@
+"""
+Tmp Cleanup - периодически удаляет осиротевшие файлы из /tmp/downloads.
+
+Обычно файлы удаляются в finally хендлера, но после рестарта контейнера,
+OOM или необработанного исключения они остаются навсегда и папка растёт
+без ограничений. Раз в CLEANUP_INTERVAL удаляем всё, что не трогали
+дольше MAX_FILE_AGE.
+
+Возраст считаем по max(mtime, ctime): mtime сам по себе врёт — instaloader
+ставит файлу дату публикации поста (и shutil.move её сохраняет), yt-dlp —
+Last-Modified с сервера, так что только что скачанный файл может иметь
+mtime недельной давности. ctime же обновляется при создании, переименовании
+и смене timestamp'ов, поэтому у файла в работе он свежий.
+"""
+import asyncio
+import logging
+import os
+import time
+
+logger = logging.getLogger(__name__)
+
+# Папка со временными файлами скачивания
+TMP_DOWNLOADS_PATH = '/tmp/downloads'
+
+# Интервал очистки (секунды)
+CLEANUP_INTERVAL = 10 * 60
+
+# Файлы старше этого возраста считаются осиротевшими (секунды)
+MAX_FILE_AGE = 3 * 60 * 60
+
+
+def _last_touched(st: os.stat_result) -> float:
+    """Когда файл последний раз трогали: mtime может быть выставлен из прошлого"""
+    return max(st.st_mtime, st.st_ctime)
+
+
+def _remove_stale_files(path: str, cutoff: float) -> tuple[int, int]:
+    """Удаляет файлы, не тронутые с cutoff (рекурсивно), и опустевшие старые подпапки.
+
+    Returns:
+        (removed_files, freed_bytes)
+    """
+    removed = 0
+    freed = 0
+    try:
+        with os.scandir(path) as it:
+            for entry in it:
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        sub_removed, sub_freed = _remove_stale_files(entry.path, cutoff)
+                        removed += sub_removed
+                        freed += sub_freed
+                        # Только старые и опустевшие (свежую пустую папку может
+                        # прямо сейчас наполнять загрузчик)
+                        if _last_touched(entry.stat(follow_symlinks=False)) < cutoff:
+                            try:
+                                os.rmdir(entry.path)
+                            except OSError:
+                                pass
+                    elif entry.is_file(follow_symlinks=False):
+                        st = entry.stat(follow_symlinks=False)
+                        if _last_touched(st) < cutoff:
+                            os.remove(entry.path)
+                            removed += 1
+                            freed += st.st_size
+                except OSError:
+                    pass  # Файл удалили во время обхода
+    except OSError:
+        pass
+    return removed, freed
+
+
+async def tmp_cleanup_loop():
+    """Основной цикл очистки."""
+    logger.info(f"Starting tmp cleanup (interval={CLEANUP_INTERVAL}s, max_age={MAX_FILE_AGE}s)")
+
+    try:
+        while True:
+            # Ошибка одного прохода не должна останавливать очистку навсегда
+            try:
+                cutoff = time.time() - MAX_FILE_AGE
+                removed, freed = await asyncio.to_thread(_remove_stale_files, TMP_DOWNLOADS_PATH, cutoff)
+                if removed:
+                    logger.info(f"[TMP_CLEANUP] Removed {removed} stale files, freed {freed/1024/1024:.1f}MB")
+            except Exception as e:
+                logger.error(f"Tmp cleanup error: {e}")
+            await asyncio.sleep(CLEANUP_INTERVAL)
+
+    except asyncio.CancelledError:
+        logger.info("Tmp cleanup stopped")
+
+
+def start_tmp_cleanup_task():
+    """Запускает фоновую задачу очистки /tmp/downloads."""
+    asyncio.create_task(tmp_cleanup_loop())
+    logger.info("Tmp cleanup background task started")
@@ -13,6 +13,11 @@ class Settings(BaseSettings):
     postgres_user: str = "nexus_user"
     postgres_password: str = "devpassword"
     postgres_db: str = "nexus_db"
+    # Пул соединений SQLAlchemy на процесс: pool_size постоянных + max_overflow временных.
+    # При нескольких процессах/воркерах Postgres видит (size + overflow) * N соединений
+    db_pool_size: int = 10
+    db_max_overflow: int = 20
+    db_pool_recycle: int = 1800  # секунд; переоткрываем соединение до idle-таймаутов сети/PG
 
     # Redis
     redis_host: str = "localhost"
@@ -1,4 +1,4 @@
-from .connection import engine, async_session, AsyncSessionLocal, get_db, init_db
+from .connection import engine, async_session, AsyncSessionLocal, get_db, init_db, warmup_pool
 from .models import Base, User, Bot, BotUser, ActionLog, AdminUser, UserRole, BotStatus
 
 __all__ = [
@@ -7,6 +7,7 @@ __all__ = [
     "AsyncSessionLocal",
     "get_db",
     "init_db",
+    "warmup_pool",
     "Base",
     "User",
     "Bot",
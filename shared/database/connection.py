@@ -1,4 +1,6 @@
-from typing import TYPE_CHECKING
+import asyncio
+import json
+from typing import TYPE_CHECKING, Optional
 
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker
 from shared.config import settings
@@ -6,12 +8,34 @@ from shared.config import settings
 if TYPE_CHECKING:
     from shared.database.models import Base
 
+# orjson для JSON-колонок (action_logs.details, extra_data ...) — если установлен
+try:
+    import orjson
+
+    def _json_serializer(value) -> str:
+        return orjson.dumps(value).decode()
+
+    _json_deserializer = orjson.loads
+except ImportError:
+    _json_serializer = json.dumps
+    _json_deserializer = json.loads
+
 engine = create_async_engine(
     settings.database_url,
     echo=False,
     pool_pre_ping=True,
-    pool_size=10,
-    max_overflow=20
+    pool_size=settings.db_pool_size,
+    max_overflow=settings.db_max_overflow,
+    pool_recycle=settings.db_pool_recycle,
+    json_serializer=_json_serializer,
+    json_deserializer=_json_deserializer,
+    connect_args={
+        # Кэш prepared statements на соединение (asyncpg-адаптер SQLAlchemy, по умолчанию 100):
+        # горячие запросы (трекинг, action_logs, flyer, bot_messages) не парсятся/планируются заново
+        "prepared_statement_cache_size": 500,
+        # Короткие OLTP-запросы: JIT-компиляция в Postgres только добавляет латентность
+        "server_settings": {"jit": "off"},
+    },
 )
 
 async_session = async_sessionmaker(
@@ -36,3 +60,22 @@ async def init_db():
     from shared.database.models import Base  # Local import to avoid circular dependency
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
+
+
+async def warmup_pool(size: Optional[int] = None) -> int:
+    """
+    Заранее открывает соединения пула (TCP + auth к Postgres), чтобы первые
+    апдейты после старта не платили за установку соединения.
+
+    Returns:
+        Сколько соединений удалось открыть
+    """
+    size = size or settings.db_pool_size
+    results = await asyncio.gather(
+        *(engine.connect() for _ in range(size)),
+        return_exceptions=True,
+    )
+    conns = [c for c in results if not isinstance(c, BaseException)]
+    # close() возвращает соединение в пул, а не рвёт его
+    await asyncio.gather(*(c.close() for c in conns))
+    return len(conns)
@@ -4,7 +4,7 @@ from sqlalchemy import (
     Column, Integer, BigInteger, String, DateTime,
     Boolean, Text, Enum, ForeignKey, Index, JSON, Float, UniqueConstraint
 )
-from sqlalchemy.orm import declarative_base, relationship
+from sqlalchemy.orm import declarative_base, deferred, relationship
 from sqlalchemy.sql import func
 
 Base = declarative_base()
@@ -46,11 +46,12 @@ class User(Base):
     role = Column(Enum(UserRole), default=UserRole.USER)
     is_banned = Column(Boolean, default=False)
     is_blocked = Column(Boolean, default=False)  # User blocked the bot
-    ban_reason = Column(Text, nullable=True)
+    # Редко нужные тяжёлые колонки — грузятся только при обращении (deferred)
+    ban_reason = deferred(Column(Text, nullable=True))
     created_at = Column(DateTime, server_default=func.now())
     updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
     last_active_at = Column(DateTime, server_default=func.now())
-    extra_data = Column(JSON, nullable=True)
+    extra_data = deferred(Column(JSON, nullable=True))
 
     bot_users = relationship("BotUser", back_populates="user")
     action_logs = relationship("ActionLog", back_populates="user")
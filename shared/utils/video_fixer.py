@@ -88,6 +88,42 @@ def get_video_duration(video_path: str) -> int:
         return 0
 
 
+def probe_video(video_path: str) -> tuple[int, int, int]:
+    """
+    Извлекает размеры и длительность видео одним вызовом ffprobe.
+
+    То же, что get_video_dimensions + get_video_duration, но один процесс
+    ffprobe вместо двух.
+
+    Args:
+        video_path: Путь к видео файлу
+
+    Returns:
+        Кортеж (width, height, duration). Что не удалось определить — 0
+    """
+    try:
+        probe_cmd = [
+            'ffprobe', '-v', 'error', '-select_streams', 'v:0',
+            '-show_entries', 'stream=width,height:format=duration',
+            '-of', 'json', video_path
+        ]
+        result = subprocess.run(probe_cmd, capture_output=True, text=True, timeout=10)
+
+        data = json.loads(result.stdout.strip())
+        streams = data.get('streams', [])
+        stream = streams[0] if streams else {}
+        width = stream.get('width', 0)
+        height = stream.get('height', 0)
+        duration = int(float(data.get('format', {}).get('duration', '0')))
+
+        logger.info(f"[PROBE] {video_path}: {width}x{height}, {duration}s")
+        return (width, height, duration)
+
+    except Exception as e:
+        logger.warning(f"[PROBE] Error for {video_path}: {e}")
+        return (0, 0, 0)
+
+
 def ensure_faststart(video_path: str) -> bool:
     """
     Гарантирует что moov atom находится в начале файла (faststart).